@@ -3,6 +3,10 @@ from collections import deque
 from datetime import datetime, timedelta
 import numpy as np
 from scipy.stats import norm
+from helper import EPOCH_ORDINAL, hour_buckets, time_difference_in_years, years_between_many
+from market_data import NS_PER_DAY, MarketData, QuoteTape, to_ns
+from pricing import VolatilitySurfaceCache
+from symbols import SYMBOLS, parse_symbol
 
 class pricing:
 
@@ -55,52 +59,35 @@ class helper:
 
     @staticmethod
     def generate_datetime(ms: int, date: str) -> datetime:
-        hour = ms // 3600000
-        ms = ms % 3600000
-        minute = ms // 60000
+        return datetime(1970, 1, 1) + timedelta(microseconds=helper.generate_ns(ms, date) // 1000)
 
-        base = datetime.strptime(date, "%Y%m%d")
-        compiled_datetime = base.replace(hour=hour, minute=minute)
-
-        return compiled_datetime
+    # ms of day and "yyyymmdd" -> int ns, to the minute
+    @staticmethod
+    def generate_ns(ms: int, date: str) -> int:
+        day = datetime(int(date[:4]), int(date[4:6]), int(date[6:8])).toordinal() - EPOCH_ORDINAL
+        return day * NS_PER_DAY + ms // 60000 * 60_000_000_000
 
 
     # timestamp_1 is the order timestamp
     # timestamp_2 is the underlying timestamp
     @staticmethod
     def compare_times(timestamp_1: str, timestamp_2ms: int, timestamp_2day: str) -> bool:
-        timestamp_1 = timestamp_1[:26] + 'Z'
-        dt1 = datetime.strptime(timestamp_1, "%Y-%m-%dT%H:%M:%S.%fZ")
-        dt2 = helper.generate_datetime(timestamp_2ms, timestamp_2day)
-
-        return dt1 > dt2 
+        # to the microsecond, as datetimes would compare
+        return int(to_ns([timestamp_1])[0]) // 1000 * 1000 > helper.generate_ns(timestamp_2ms, timestamp_2day)
 
 
     @staticmethod
     def time_difference_in_years(date1: str, date2: datetime) -> float:
-        # Parse the first date formatted as "yyyy-mm-dd"
-        date1_parsed = datetime.strptime(date1, "%Y-%m-%d")
-        
-        # Calculate the difference in days
-        difference_in_days = abs((date1_parsed - date2).days)
-        
-        # Convert days to years
-        difference_in_years = difference_in_days / 365.25  # Considering leap years
-        
-        return difference_in_years
+        return time_difference_in_years(date1, date2)
 
     @staticmethod
     def parse_option_symbol(symbol) -> dict:
         """
-        EXAMPLE: SPX 20230120P2800000
+        EXAMPLE: SPX   240419C00800000
         """
-        numbers : str = symbol.split(" ")[1]
-        date : str = numbers[:8]
-        date_yymmdd : str = date[0:4] + "-" + date[4:6] + "-" + date[6:8]
-        action : str = numbers[8]
-        strike_price : float = int(numbers[9:])/1000
+        expiry, action, strike_price = parse_symbol(symbol)
         return {
-            "expiry": datetime.strptime(date_yymmdd, "%Y-%m-%d"),
+            "expiry": expiry,
             "action": action,
             "strike": strike_price
         }
@@ -124,92 +111,97 @@ class helper:
 
 class Strategy:
   
-    def __init__(self, start_date, end_date, options_data, underlying) -> None:
+    def __init__(self, start_date, end_date, options_data, underlying, market_data: MarketData = None,
+                 min_ask: float = 25, edge: float = 10, max_quotes: int = 25, vol_surface: bool = False) -> None:
         self.capital : float = 100_000_000
         self.portfolio_value : float = 0
 
         self.start_date : datetime = start_date
         self.end_date : datetime = end_date
       
-        self.options : pd.DataFrame = pd.read_csv(options_data)
-        self.options["day"] = self.options["ts_recv"].apply(lambda x: x.split("T")[0])
+        # shared with the backtester when given, see Backtester
+        self.market_data : MarketData = market_data if market_data is not None else MarketData(options_data, hourly_csv=underlying)
+        # only read batch by batch, see on_quote
+        self.options : QuoteTape = self.market_data.tape
 
-        self.underlying = pd.read_csv(underlying)
-        self.underlying.columns = self.underlying.columns.str.lower()
+        self.underlying = self.market_data.read_hourly()
         self.size = len(self.underlying)
 
         # earliest possible hour
         self.minute_ptr = 5
         self.ctr = 0
 
+        # tunables, see sweep.py
+        self.min_ask : float = min_ask
+        self.edge : float = edge
+        self.max_quotes : int = max_quotes
+        # with vol_surface, quotes are valued at the implied volatility of the quotes seen
+        # before them in the same hourly bucket instead of the flat 0.15
+        self.surfaces = VolatilitySurfaceCache(r=0.03) if vol_surface else None
+        self.bucket = None
+        self.previous_bucket = None
 
-    def generate_orders(self) -> pd.DataFrame:
 
-        orders = []
-        for row in self.options.itertuples():
-
-            if (self.ctr == 25):
-                break
-            
-            if (self.minute_ptr > self.size - 50):
-                break
-
-            """
-            # if the minute ptr is ahead, wait until orders catch up
-            while not (helper.compare_times(row.ts_recv, int(self.underlying.iloc[self.minute_ptr]["ms_of_day"]), self.underlying.iloc[self.minute_ptr]["date"])):
-                continue
-
-            # bring minute ptr to most recent time before order
-            while (self.minute_ptr < self.size - 50) and row.ts_recv, int(self.underlying.iloc[self.minute_ptr]["ms_of_day"]), self.underlying.iloc[self.minute_ptr]["date"]:
-                self.minute_ptr += 1
-            self.minute_ptr -= 1
-
-            mid = float(self.underlying.iloc[self.minute_ptr]["price"])
-
-            if (mid == 0.0):
-                mid = float(self.underlying.iloc[self.minute_ptr-1]["price"])
-            """
-            
-            mid = 5000
-            
-
-            symbol_data = helper.parse_option_symbol(row.symbol)
-
-            if (row.ask_px_00 < 25):
-                continue
-
-            order = {}
-
-            # If the order is an overvalued call then we can sell it
-            if (symbol_data["action"] == 'C'):
-                time_to_expiry = helper.time_difference_in_years(row.ts_recv[:10], symbol_data["expiry"])
-                expected = pricing.black_scholes_call(mid, symbol_data["strike"], time_to_expiry)
-
-                if (expected < row.bid_px_00 - 10):
-                    order = {
-                        "datetime" : row.ts_recv,
-                        "option_symbol" : row.symbol,
-                        "action" : "S",
-                        "order_size" : max(int(row.bid_sz_00)//4, 1)
-                    }
-                    orders.append(order)
-            # If the order is an overvalued put then we can sell it
-            else:
-                time_to_expiry = helper.time_difference_in_years(row.ts_recv[:10], symbol_data["expiry"])
-                expected = pricing.black_scholes_call(mid, symbol_data["strike"], time_to_expiry)
+    def on_quote(self, batch) -> pd.DataFrame:
+        """
+        sells calls and puts quoted more than edge over their Black-Scholes value, over the
+        first max_quotes quotes with an ask of at least min_ask
+        """
+        if (self.ctr >= self.max_quotes) or (self.minute_ptr > self.size - 50):
+            return None
+
+        mid = 5000
 
-                if (expected < row.bid_px_00 - 10):
-                    order = {
-                        "datetime" : row.ts_recv,
-                        "option_symbol" : row.symbol,
-                        "action" : "S",
-                        "order_size" : max(int(row.bid_sz_00)//4, 1)
-                    }
-                    orders.append(order)
-            self.ctr += 1
+        rows = np.flatnonzero(~(batch["ask_px_00"] < self.min_ask))[:self.max_quotes - self.ctr]
+        self.ctr += len(rows)
 
+        ts = batch["ts_recv"][rows]
+        symbol_ids = batch["symbol_id"][rows]
+        bid_px_00 = batch["bid_px_00"][rows]
+        time_to_expiry = years_between_many(ts // NS_PER_DAY, SYMBOLS.expiration_date[symbol_ids])
 
-        return pd.DataFrame(orders)
+        sigma = 0.15
+        if self.surfaces is not None:
+            sigma = self.volatilities(batch, rows, mid, time_to_expiry)
+
+        # puts are valued with the call formula too
+        with np.errstate(divide="ignore", invalid="ignore"):
+            expected = pricing.black_scholes_call(mid, SYMBOLS.strike[symbol_ids], time_to_expiry, sigma=sigma)
+
+        sell = expected < bid_px_00 - self.edge
+        return pd.DataFrame({
+            "datetime" : pd.Series(np.datetime_as_string(ts[sell].astype("datetime64[ns]")), dtype=object) + "Z",
+            "option_symbol" : [SYMBOLS[symbol_id] for symbol_id in symbol_ids[sell]],
+            "action" : "S",
+            "order_size" : np.maximum(batch["bid_sz_00"][rows][sell].astype(np.int64) // 4, 1)
+        })
+
+    def volatilities(self, batch, rows, mid, time_to_expiry) -> np.ndarray:
+        """
+        volatility for the quotes at rows from the surface of the last completed hourly
+        bucket (0.15 before there is one), adding the batch to the surfaces one bucket
+        at a time as it goes, so no quote is valued with its own hour's quotes
+        """
+        buckets = hour_buckets(batch["ts_recv"])
+        strikes = SYMBOLS.strike[batch["symbol_id"]]
+        expiry = years_between_many(batch["ts_recv"] // NS_PER_DAY, SYMBOLS.expiration_date[batch["symbol_id"]])
+        sigma = np.empty(len(rows))
+        # the tape is time sorted, so each bucket is one run of the batch
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        for start, stop in zip(starts.tolist(), np.r_[starts[1:], len(buckets)].tolist()):
+            bucket = int(buckets[start])
+            if bucket != self.bucket:
+                self.previous_bucket, self.bucket = self.bucket, bucket
+            at = (rows >= start) & (rows < stop)
+            sigma[at] = self.surfaces.sigma(self.previous_bucket, strikes[rows[at]], time_to_expiry[at])
+            self.surfaces.update(bucket, mid, strikes[start:stop], expiry[start:stop], batch["bid_px_00"][start:stop],
+                                 batch["ask_px_00"][start:stop], SYMBOLS.is_call[batch["symbol_id"][start:stop]])
+        return sigma
+
+    def generate_orders(self) -> pd.DataFrame:
+        orders = [self.on_quote(batch) for batch in self.options.batches()]
+        orders = [order for order in orders if order is not None]
+        return pd.concat(orders, ignore_index=True) if orders else pd.DataFrame()
 
 
 if __name__ == "__main__":
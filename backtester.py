@@ -1,38 +1,125 @@
-import math
+import threading
+import metrics
 import numpy as np
 import pandas as pd
-from typing import List
+from queue import Queue
+from typing import Iterator, List, Tuple
 import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
+from datetime import datetime
+from market_data import CLOSE, NS_PER_DAY, ORDER, QUOTES, SNAPSHOTS, LatestQuotes, MarketData, MinuteBars, QuoteTape, TradingCalendar, day_range, merge_events, to_ns
+from instrumentation import Instruments, ProgressLog
+from order_book import OrderBook
+from positions import BUY, SELL, PositionBook
+from risk import RiskEngine
+from symbols import SYMBOLS, parse_symbol
+
+ORDER_COLUMNS : tuple = ("datetime", "option_symbol", "action", "order_size")
+# the last 15 characters of an OCC symbol: yymmdd, C/P and the strike * 1000
+OCC_SYMBOL : str = r".*\d{6}[CP]\d{8}"
+
+def prefetch(iterator, depth: int) -> Iterator:
+  """
+  runs iterator on a background thread, at most depth items ahead of the consumer
+  """
+  queue : Queue = Queue(maxsize=depth)
+  done = object()
+
+  def produce() -> None:
+    try:
+      for item in iterator:
+        queue.put((item, None))
+    except BaseException as error:
+      queue.put((done, error))
+      return
+    queue.put((done, None))
+
+  threading.Thread(target=produce, daemon=True).start()
+  while True:
+    item, error = queue.get()
+    if error is not None:
+      raise error
+    if item is done:
+      return
+    yield item
 
 class Backtester:
-
-  def __init__(self, start_date, end_date, strategy) -> None:
-    self.capital : float = 100_000_000
+  """
+  Strategies either return every order up front from generate_orders(), or are driven
+  on-line while the tape is replayed: on_bar(bar) is called for each SPX minute bar and
+  on_quote(batch) for each batch of quotes (a dict of ts_recv, symbol_id, bid/ask price
+  and size arrays), and both may return orders as a DataFrame, a list of order dicts or
+  None. On-line orders are stamped with "datetime" or an int64 ns "ts" and are filled in
+  time order against the quotes as of that timestamp.
+
+  With prefetch > 0 signal generation runs up to that many batches ahead of the fill
+  simulation on a background thread, so on-line callbacks must not read backtester state.
+
+  Market data is shared with the strategy: pass the strategy's MarketData in, or it is
+  taken from strategy.market_data, and only loaded here when neither is there.
+
+  With intraday set, capital plus portfolio value (with open positions marked to their
+  latest quotes) is also recorded at the end of every SPX session minute into
+  intraday_pnl, next to its timestamps in intraday_ts. intraday_path puts that array in
+  a memory-mapped .npy file instead of memory.
+
+  With instrument set, each phase (data load, order preparation, signal generation,
+  quote updates, fills, settlement, marking) is timed and counted in self.instruments
+  and summarised after calculate_pnl; profile_path also dumps a cProfile of it. Daily
+  progress is logged at most once every progress_interval seconds (None for silence).
+
+  With partial_fills set, orders only fill up to the size displayed at the quote
+  (ask_sz_00 for buys, bid_sz_00 for sells) and every fill consumes that size until the
+  next quote for the symbol. The unfilled remainder rests in self.book and fills
+  against later quotes for the same symbol, at their prices, until the close of the day.
+  Without it every order fills whole at the quote, whatever size is displayed.
+
+  Open positions are marked at every close against one of the tape's daily snapshots
+  (see DailySnapshots): mark="open" (the default) uses each symbol's first quote of the
+  day, "last" its last quote and "close" its last quote at or before the 16:00 EST close.
+
+  Each run starts from capital, which is also what the metrics measure returns against.
+  To run several strategies over one pass of the tape, see portfolio.Portfolio.
+  """
+
+  def __init__(self, start_date, end_date, strategy, prefetch: int = 0, market_data: MarketData = None,
+               intraday: bool = False, intraday_path: str = None, instrument: bool = False,
+               profile_path: str = None, progress_interval: float = 1.0, partial_fills: bool = False,
+               mark: str = "open", capital: float = 100_000_000) -> None:
+    self.instruments : Instruments = Instruments(instrument or profile_path is not None, profile_path)
+    self.progress : ProgressLog = ProgressLog(progress_interval)
+    self.initial_capital : float = capital
+    self.capital : float = capital
     self.portfolio_value : float = 0
 
     self.start_date : datetime = start_date
     self.end_date : datetime = end_date
   
     self.user_strategy = strategy
-    self.orders : pd.DataFrame = self.user_strategy.generate_orders()
-    self.orders["day"] = self.orders["datetime"].apply(lambda x: x.split("T")[0])
-    self.orders["hour"] = self.orders["datetime"].apply(lambda x: int(x.split("T")[1].split(".")[0].split(":")[0]))
-    self.orders["minute"] = self.orders["datetime"].apply(lambda x: int(x.split("T")[1].split(".")[0].split(":")[1]))
-    self.orders["expiration_date"] = self.orders["option_symbol"].apply(lambda x: self.get_expiration_date(x))
-    self.orders["sort_by"] = pd.to_datetime(self.orders["datetime"])
-    self.orders = self.orders.sort_values(by="sort_by", kind="stable")
-
-    self.options : pd.DataFrame = pd.read_csv("data/cleaned_options_data.csv")
-    self.options["day"] = self.options["ts_recv"].apply(lambda x: x.split("T")[0])
-    self.options["hour"] = self.options["ts_recv"].apply(lambda x: int(x.split("T")[1].split(".")[0].split(":")[0])) # FIX
-
-    self.underlying = pd.read_csv("data/spx_minute_level_data_jan_mar_2024.csv")
-    self.underlying.columns = self.underlying.columns.str.lower()
-    self.underlying["date"] = self.underlying["date"].astype(str)
-    self.underlying["day"] = self.underlying["date"].apply(lambda x : x[:4] + "-" + x[4:6] + "-" + x[6:])
-    self.underlying["hour"] = self.underlying["ms_of_day"].apply(lambda x : self.convert_ms_to_hhmm(x)[0])
-    self.underlying["minute"] = self.underlying["ms_of_day"].apply(lambda x : self.convert_ms_to_hhmm(x)[1])
+    if market_data is None:
+      market_data = getattr(strategy, "market_data", None)
+    with self.instruments.timer("load"):
+      self.market_data : MarketData = market_data if market_data is not None else MarketData()
+    self.online : bool = hasattr(strategy, "on_quote") or hasattr(strategy, "on_bar")
+    self.prefetch : int = prefetch
+    self.partial_fills : bool = partial_fills
+    if mark not in SNAPSHOTS:
+      raise ValueError(f"mark must be one of {SNAPSHOTS}, not {mark!r}")
+    self.mark : str = mark
+    self.intraday : bool = intraday or intraday_path is not None
+    self.intraday_path : str = intraday_path
+    self.intraday_ts : np.ndarray = np.array([], dtype=np.int64)
+    self.intraday_pnl : np.ndarray = np.array([], dtype=np.float64)
+    with self.instruments.timer("generate_orders"):
+      orders = None if self.online else self.user_strategy.generate_orders()
+    self.rejected_orders : pd.DataFrame = pd.DataFrame(columns=ORDER_COLUMNS + ("reason",))
+    self.orders : pd.DataFrame = self.prepare_orders(orders)
+
+    # streamed in time order from the memory-mapped column cache, never loaded whole
+    self.options : QuoteTape = self.market_data.tape
+
+    self.underlying = self.market_data.underlying
+    self.minute_bars : MinuteBars = self.market_data.minute_bars
+    self.calendar : TradingCalendar = self.market_data.calendar
     # self.underlying["day"] = self.underlying["date"].apply(lambda x : x.split(" ")[0])
     # self.underlying["hour"] = self.underlying["date"].apply(lambda x : int(x.split(" ")[1].split("-")[0].split(":")[0]))
 
@@ -41,11 +128,64 @@ class Backtester:
     self.overall_return : float = 0
     self.sharpe_ratio : float = 0
     self.overall_score : float = 0
-    self.open_orders : pd.DataFrame = pd.DataFrame(columns=["day", "datetime", "option_symbol", 
-                                                            "action", "order_size", "expiration_date", 
-                                                            "hour", "minute", "bid_px_00", "ask_px_00",
-                                                            "running_bid_px_00", "running_ask_px_00"])
-    self.open_orders["order_size"] = self.open_orders["order_size"].astype(float)
+    self.sortino_ratio : float = 0
+    self.calmar_ratio : float = 0
+    self.turnover : float = 0
+    self.hit_rate : float = 0
+    # option notional filled per day, next to self.pnl
+    self.traded : List = []
+    self.traded_today : float = 0
+    self.open_orders : PositionBook = PositionBook()
+    # margin checks and running exposure of open_orders
+    self.risk : RiskEngine = RiskEngine(self.open_orders)
+
+  def prepare_orders(self, orders) -> pd.DataFrame:
+    """
+    a strategy's orders (DataFrame, list of order dicts or None) as the time-sorted
+    frame the fill loop reads. Timestamps are parsed once into int64 ns "ts", from which
+    "day" (days since epoch), "hour" and "minute" on the tape clock are derived, and
+    "symbol_id" / "expiration_date" (days since epoch) come from the symbol table.
+    Rows with an unparseable timestamp or symbol, an action other than B/S or a size
+    that is missing, infinite or not positive are set aside in self.rejected_orders with
+    a reason instead.
+    """
+    with self.instruments.timer("prepare_orders"):
+      if orders is None or len(orders) == 0:
+        orders = pd.DataFrame(columns=ORDER_COLUMNS)
+      elif not isinstance(orders, pd.DataFrame):
+        orders = pd.DataFrame(orders)
+      if "datetime" in orders:
+        ts : np.ndarray = to_ns(orders["datetime"], errors="coerce")
+      else:
+        ts = orders["ts"].to_numpy(dtype=np.int64)
+        orders["datetime"] = pd.Series(np.datetime_as_string(ts.astype("datetime64[ns]")), index=orders.index) + "Z"
+      order_size : np.ndarray = pd.to_numeric(orders["order_size"], errors="coerce").to_numpy(dtype=np.float64)
+      # symbols are checked and interned once per distinct symbol
+      codes, symbols = pd.factorize(orders["option_symbol"])
+      symbols = pd.Series(np.asarray(symbols, dtype=object), dtype=object)
+      well_formed : np.ndarray = symbols.astype(str).str.fullmatch(OCC_SYMBOL).to_numpy(dtype=bool)
+      symbol_ids : np.ndarray = np.full(len(symbols), -1, dtype=np.int64)
+      symbol_ids[well_formed] = SYMBOLS.intern_many(symbols[well_formed])
+      symbol_ids = np.where(codes >= 0, symbol_ids[np.maximum(codes, 0)] if len(symbol_ids) else -1, -1)
+
+      reasons : np.ndarray = np.select(
+        [ts == np.iinfo(np.int64).min, symbol_ids < 0,
+         ~orders["action"].isin(("B", "S")).to_numpy(), ~np.isfinite(order_size) | (order_size <= 0)],
+        ["datetime", "option_symbol", "action", "order_size"], default="")
+      valid : np.ndarray = reasons == ""
+      if not valid.all():
+        rejected : pd.DataFrame = orders[~valid].assign(reason=reasons[~valid])
+        self.rejected_orders = pd.concat([self.rejected_orders, rejected]) if len(self.rejected_orders) > 0 else rejected
+        self.instruments.count("rejected", len(rejected))
+        print(f"Rejected {len(rejected)} invalid orders, see rejected_orders")
+        orders, ts, order_size, symbol_ids = orders[valid], ts[valid], order_size[valid], symbol_ids[valid]
+
+      orders = orders.assign(order_size=order_size, ts=ts, day=ts // NS_PER_DAY,
+                             hour=ts % NS_PER_DAY // 3_600_000_000_000, minute=ts % 3_600_000_000_000 // 60_000_000_000,
+                             symbol_id=symbol_ids, expiration_date=SYMBOLS.expiration_date[symbol_ids].astype(np.int64))
+      if np.all(ts[1:] >= ts[:-1]):
+        return orders
+      return orders.iloc[np.argsort(ts, kind="stable")]
 
   def convert_ms_to_hhmm(self, milliseconds):
     total_seconds = milliseconds // 1000
@@ -55,258 +195,354 @@ class Backtester:
     return [hours + 5, remaining_minutes] # + 5 to account for UTC->EST
 
   def get_expiration_date(self, symbol) -> str:
-    numbers : str = symbol.split(" ")[3]
-    date : str = numbers[:6]
-    date_yymmdd : str = "20" + date[0:2] + "-" + date[2:4] + "-" + date[4:6]
-    return date_yymmdd
+    return str(parse_symbol(symbol).expiry.date())
 
   def parse_option_symbol(self, symbol) -> List:
     """
     example: SPX   240419C00800000
     """
-    numbers : str = symbol.split(" ")[3]
-    date : str = numbers[:6]
-    date_yymmdd : str = "20" + date[0:2] + "-" + date[2:4] + "-" + date[4:6]
-    action : str = numbers[6]
-    strike_price : float = float(numbers[7:]) / 1000
-    return [datetime.strptime(date_yymmdd, "%Y-%m-%d"), action, strike_price]
+    return list(parse_symbol(symbol))
   
-  def check_option_is_open(self, row: pd.Series) -> bool:
-    same: pd.DataFrame = self.open_orders[(self.open_orders["option_symbol"] == row["option_symbol"])]
-    if len(same) > 0:
-      assert len(same) == 1
-      assert float(row["order_size"])
-      same_index: int = same.index[0]
-      if row["action"] == same["action"].iloc[0]:
-        self.open_orders.loc[same_index, "order_size"] += float(row["order_size"])
+  def check_option_is_open(self, option_symbol: str, action: str, order_size: float) -> bool:
+    return self.open_orders.net(option_symbol, BUY if action == "B" else SELL, float(order_size))
+
+  def open_position(self, order, option_metadata: List, bid_px_00: float, ask_px_00: float) -> None:
+    self.open_orders.open(order.option_symbol, int(order.symbol_id),
+                          BUY if order.action == "B" else SELL, float(order.order_size),
+                          option_metadata[1] == "C", option_metadata[2], int(order.expiration_date),
+                          order.hour, order.minute, bid_px_00, ask_px_00)
+
+  def fill_order(self, order) -> bool:
+    side : int = BUY if order.action == "B" else SELL
+    if not self.quotes.has_quote_on(order.symbol_id, order.ts // NS_PER_DAY):
+      if self.partial_fills:
+        self.book.rest(order.symbol_id, side, order, float(order.order_size))
+      return False
+    order_size = float(order.order_size)
+    ask_price = float(self.quotes.ask_px_00[order.symbol_id])
+    buy_price = float(self.quotes.bid_px_00[order.symbol_id])
+    price = self.minute_bars.price(order.day, order.hour, order.minute)
+
+    if not self.partial_fills:
+      return self.execute(order, order_size, buy_price, ask_price, price)
+
+    size : float = min(order_size, self.book.available(order.symbol_id, side))
+    if size <= 0:
+      self.book.rest(order.symbol_id, side, order, order_size)
+      return False
+    if not self.execute(order, size, buy_price, ask_price, price):
+      return False
+    self.book.consume(order.symbol_id, side, size)
+    if size < order_size:
+      self.book.rest(order.symbol_id, side, order, order_size - size)
+    return True
+
+  def fill_resting(self, run: dict) -> None:
+    """
+    fills resting orders against the displayed size of each quote in a run, oldest
+    first; a remainder the capital cannot cover any more is cancelled
+    """
+    rows : np.ndarray = self.book.waiting_rows(run["symbol_id"])
+    if len(rows) == 0:
+      return
+    underlying_price : np.ndarray = self.minute_bars.prices_at(run["ts_recv"][rows])
+    for k, row in enumerate(rows.tolist()):
+      symbol_id : int = int(run["symbol_id"][row])
+      buy_price : float = float(run["bid_px_00"][row])
+      ask_price : float = float(run["ask_px_00"][row])
+      for side, displayed in ((BUY, run["ask_sz_00"][row]), (SELL, run["bid_sz_00"][row])):
+        available : float = float(displayed)
+        queue = self.book.queue(symbol_id, side)
+        while queue and available > 0:
+          resting = queue[0]
+          size : float = min(resting[1], available)
+          if not self.execute(resting[0], size, buy_price, ask_price, float(underlying_price[k])):
+            self.book.pop(symbol_id, side)
+            self.instruments.count("cancelled")
+            continue
+          available -= size
+          resting[1] -= size
+          if resting[1] <= 0:
+            self.book.pop(symbol_id, side)
+        self.book.display(symbol_id, side, available)
+
+  def execute(self, order, order_size: float, buy_price: float, ask_price: float, price: float) -> bool:
+    """
+    fills order_size of an order at the given bid/ask if the capital covers its margin
+    (price is SPX at the time of the fill)
+    """
+    if order.action not in ("B", "S") or not self.risk.can_fill(order, order_size, buy_price, ask_price, price, self.capital):
+      return False
+    option_metadata = self.parse_option_symbol(order.option_symbol)
+
+    if order.action == "B":
+      options_cost = order_size * 100 * ask_price
+      self.capital -= options_cost + 0.5
+      self.portfolio_value += options_cost
+    else:
+      options_cost = order_size * 100 * buy_price
+      self.capital += order_size * buy_price * 100
+    self.traded_today += options_cost
+
+    previous_slot = self.open_orders.slots.get(order.option_symbol)
+    if not self.check_option_is_open(order.option_symbol, order.action, order_size):
+      self.open_position(order, option_metadata, buy_price, ask_price)
+    self.risk.track(order.option_symbol, previous_slot, price, order.ts)
+    return True
+
+  def close_day(self, day: int, previous_day: int = None) -> None:
+    """
+    end of a trading session (days since epoch): settles what expired since the
+    previous session's close, marks open positions and records the day's pnl
+    """
+    if self.partial_fills:
+      self.instruments.count("cancelled", self.book.cancel_all())
+    book : PositionBook = self.open_orders
+    expiring : np.ndarray = book.expiring(day, day - 1 if previous_day is None else previous_day)
+    self.instruments.count("settled", len(expiring))
+    if len(expiring) > 0:
+      with self.instruments.timer("settlement"):
+        underlying_price = self.minute_bars.prices[self.minute_bars.ordinal(np.datetime64(day, "D")),
+                                                   self.minute_bars.clamp(book.hour[expiring], book.minute[expiring])]
+        capital, portfolio_value = book.settle(expiring, underlying_price)
+      self.capital += capital
+      self.portfolio_value += portfolio_value
+
+    # go through open orders and see if price of options people are holding have changed
+    open_slots : np.ndarray = book.open_slots()
+    bid, ask = self.market_data.snapshots.quotes(self.mark, day, book.symbol_id[open_slots])
+    quoted : np.ndarray = ~np.isnan(bid)
+    if quoted.any():
+      with self.instruments.timer("marking"):
+        capital, portfolio_value = book.mark(open_slots[quoted], bid[quoted], ask[quoted])
+        self.risk.refresh(open_slots[quoted])
+      self.capital += capital
+      self.portfolio_value += portfolio_value
+
+    # self.portfolio_value = max(self.portfolio_value, 0)
+    self.risk.release_many(expiring)
+    book.remove_expiring(day, day - 1 if previous_day is None else previous_day)
+
+    self.pnl.append(self.capital + self.portfolio_value)
+    self.traded.append(self.traded_today)
+    self.traded_today = 0
+
+  def signals(self, range_start: int, range_end: int, batches: Iterator = None) -> Iterator[tuple]:
+    """
+    (quote batch, cutoff, orders) for each tape batch: the orders the strategy's on-line
+    callbacks returned for the bars and quotes up to cutoff (None for an up-front strategy),
+    and a last (None, range_end, orders) once the tape runs out. batches defaults to a
+    fresh scan of the tape over the range.
+    """
+    on_bar = getattr(self.user_strategy, "on_bar", None)
+    on_quote = getattr(self.user_strategy, "on_quote", None)
+    bars = self.minute_bars.bars(range_start, range_end)
+    bar = next(bars, None)
+    if batches is None:
+      batches = self.options.batches(range_start, range_end)
+    while True:
+      batch = next(batches, None)
+      cutoff : int = range_end if batch is None else int(batch["ts_recv"][-1])
+      if not self.online:
+        yield batch, cutoff, None
+        if batch is None:
+          return
+        continue
+
+      orders : List = []
+      with self.instruments.timer("signals"):
+        while on_bar is not None and bar is not None and bar.ts <= cutoff:
+          orders.append(on_bar(bar))
+          bar = next(bars, None)
+        if on_quote is not None and batch is not None:
+          orders.append(on_quote(batch))
+        orders = [pd.DataFrame(order) if isinstance(order, list) else order for order in orders if order is not None and len(order) > 0]
+        orders = self.prepare_orders(pd.concat(orders, ignore_index=True) if orders else None)
+      yield batch, cutoff, orders
+      if batch is None:
+        return
+
+  def revalue(self, symbol_ids: np.ndarray) -> None:
+    """
+    re-marks the open positions among the given (distinct) symbols to their latest quotes
+    """
+    if len(self.open_orders) == 0:
+      return
+    slots : np.ndarray = self.open_orders.slots_of(symbol_ids)
+    held : np.ndarray = slots >= 0
+    if held.any():
+      symbol_ids = symbol_ids[held]
+      self.open_orders.revalue(slots[held], self.quotes.bid_px_00[symbol_ids], self.quotes.ask_px_00[symbol_ids])
+
+  def on_quotes(self, run: dict, updated: np.ndarray) -> None:
+    """
+    after a run of quotes was applied to self.quotes, updated being the symbols it touched
+    """
+    if self.partial_fills:
+      with self.instruments.timer("resting"):
+        self.book.refresh(updated, self.quotes.bid_sz_00[updated], self.quotes.ask_sz_00[updated])
+        self.fill_resting(run)
+    if self.intraday:
+      with self.instruments.timer("revalue"):
+        self.revalue(updated)
+
+  def on_order(self, order) -> None:
+    if order.symbol_id >= len(self.quotes) or order.symbol_id >= len(self.book.waiting):
+      # a symbol first seen in an on-line order, not on the tape when the run started
+      self.quotes.grow(len(SYMBOLS))
+      self.book.grow(len(SYMBOLS))
+    with self.instruments.timer("fills"):
+      filled : bool = self.fill_order(order)
+    self.instruments.count("orders")
+    self.instruments.count("filled", filled)
+    if self.intraday:
+      with self.instruments.timer("revalue"):
+        self.revalue(np.array([order.symbol_id]))
+
+  def on_tick(self, tick: int) -> None:
+    """
+    a tick of the clock (its index): an intraday mark, or the close of a session
+    """
+    if self.clock_mark[tick] >= 0:
+      self.intraday_pnl[self.clock_mark[tick]] = self.capital + self.portfolio_value + self.open_orders.unrealized_total
+      return
+    i : int = int(self.clock_day[tick])
+    with self.instruments.timer("close_day"):
+      self.close_day(int(self.days[i]), int(self.days[i - 1]) if i > 0 else None)
+    if self.intraday:
+      with self.instruments.timer("revalue"):
+        book : PositionBook = self.open_orders
+        self.revalue(book.symbol_id[book.open_slots()])
+        book.unrealized_total = float(book.unrealized[book.open_slots()].sum())
+    self.progress.log("day", force=i == len(self.days) - 1, date=np.datetime64(int(self.days[i]), "D"), capital=self.capital,
+                      portfolio_value=self.portfolio_value, pnl=self.capital + self.portfolio_value, open_orders=len(self.open_orders))
+
+  def replay(self, batches: List, orders: pd.DataFrame, clock_ts: np.ndarray, first_tick: int) -> None:
+    rows : List = list(orders.itertuples(index=False))
+    for kind, payload in merge_events(batches, orders["ts"].to_numpy(), clock_ts[first_tick:]):
+      if kind == QUOTES:
+        with self.instruments.timer("quotes"):
+          updated : np.ndarray = self.quotes.update(payload)
+        self.instruments.count("quote_rows", len(payload["ts_recv"]))
+        self.on_quotes(payload, updated)
+      elif kind == ORDER:
+        self.on_order(rows[payload])
+      elif kind == CLOSE:
+        self.on_tick(first_tick + payload)
+
+  def start_clock(self) -> Tuple[int, int, np.ndarray]:
+    """
+    sets up the sessions and the clock of a run, returns (range_start, range_end, clock_ts)
+    """
+    # the close of every trading session in range, weekends and holidays have none
+    self.days : np.ndarray = self.calendar.sessions(self.start_date, self.end_date)
+    range_start, range_end = day_range(self.start_date, self.end_date)
+
+    # the clock: every end of day, plus the end of every session minute for intraday marks
+    clock_ts : np.ndarray = (self.days + 1) * NS_PER_DAY
+    self.clock_day : np.ndarray = np.arange(len(self.days))
+    self.clock_mark : np.ndarray = np.full(len(self.days), -1)
+    if self.intraday:
+      self.intraday_ts = self.minute_bars.timestamps()[self.minute_bars.minutes(range_start, range_end)] + 60_000_000_000
+      if self.intraday_path is not None:
+        self.intraday_pnl = np.lib.format.open_memmap(self.intraday_path, mode="w+", dtype=np.float64, shape=(len(self.intraday_ts),))
       else:
-        if row["order_size"] > same["order_size"].iloc[0]:
-          self.open_orders.loc[same_index, "action"] = "B" if row["action"] == "S" else "S"
-          self.open_orders.loc[same_index, "order_size"] = float(row["order_size"] - same["order_size"].iloc[0])
-        elif row["order_size"] == same["order_size"].iloc[0]:
-          self.open_orders = self.open_orders.drop(index=same_index)
-        else:
-          self.open_orders.loc[same_index, "order_size"] -= float(row["order_size"])
-      return True
-    return False
+        self.intraday_pnl = np.empty(len(self.intraday_ts), dtype=np.float64)
+      ticks : np.ndarray = np.argsort(np.concatenate([clock_ts, self.intraday_ts]), kind="stable")
+      clock_ts = np.concatenate([clock_ts, self.intraday_ts])[ticks]
+      self.clock_day = np.concatenate([self.clock_day, np.full(len(self.intraday_ts), -1)])[ticks]
+      self.clock_mark = np.concatenate([self.clock_mark, np.arange(len(self.intraday_ts))])[ticks]
+    return range_start, range_end, clock_ts
+
+  def pending_orders(self, range_start: int, range_end: int) -> pd.DataFrame:
+    order_ts : np.ndarray = self.orders["ts"].to_numpy()
+    return self.orders.iloc[np.searchsorted(order_ts, range_start):np.searchsorted(order_ts, range_end)]
+
+  @staticmethod
+  def queue_orders(pending: pd.DataFrame, orders: pd.DataFrame, range_start: int, range_end: int) -> pd.DataFrame:
+    """
+    pending with the on-line orders of a batch that fall in range added, in time order
+    """
+    if orders is None or len(orders) == 0:
+      return pending
+    orders = orders[(orders["ts"] >= range_start) & (orders["ts"] < range_end)]
+    return pd.concat([pending, orders]).sort_values(by="ts", kind="stable") if len(pending) > 0 else orders
 
-  def calculate_pnl(self):
-    delta: timedelta = timedelta(days=1)
-    current_date: datetime = self.start_date
-
-    while current_date <= self.end_date:
-      day_str = str(current_date).split(" ")[0]
-      today_orders = self.orders[self.orders["day"] == day_str]
-      option_metadata_cache = {}
-
-      for _, row in today_orders.iterrows():
-        option_symbol = row["option_symbol"]
-        if option_symbol not in option_metadata_cache:
-          option_metadata_cache[option_symbol] = self.parse_option_symbol(option_symbol)
-        option_metadata = option_metadata_cache[option_symbol]
-        order_size = float(row["order_size"])
-        strike_price = option_metadata[2]
-
-        matching_row = self.options[
-          (self.options["symbol"] == option_symbol) &
-          (self.options["ts_recv"] == row["datetime"])
-        ]
-
-        if not matching_row.empty:
-          matching_row = matching_row.iloc[0]
-        else:
-          continue
-
-        row["hour"] = 14 if row["hour"] < 14 else min(row["hour"], 21)
-        if row["hour"] == 14:
-          row["minute"] = 31
-        elif row["hour"] == 21:
-          row["minute"] = 0
-
-        ask_price = float(matching_row["ask_px_00"])
-        buy_price = float(matching_row["bid_px_00"])
-        ask_size = float(matching_row["ask_sz_00"])
-        buy_size = float(matching_row["bid_sz_00"])
-
-        row["bid_px_00"] = buy_price
-        row["ask_px_00"] = ask_price
-        row["running_bid_px_00"] = buy_price
-        row["running_ask_px_00"] = ask_price
-
-        price = float(self.underlying[
-                        (self.underlying["day"] == row["day"]) &
-                        (self.underlying["hour"] == row["hour"]) &
-                        (self.underlying["minute"] == row["minute"])
-                        ]["price"].iloc[0])
-                  
-        if order_size < 0:
-          raise ValueError("Order size must be positive")
-
-        # if (row["action"] == "B" and order_size > ask_size) or (row["action"] == "S" and order_size > buy_size):
-        #   raise ValueError(f"Order size exceeds available size; order size: {order_size}, ask size: {ask_size}, buy size: {buy_size}; action: {row['action']}")
-
-        if row["action"] == "B":
-          options_cost = order_size * 100 * ask_price
-          margin = options_cost + 0.1 * strike_price if option_metadata[1] == "C" else options_cost + 0.1 * price
-          margin = 0 if row["option_symbol"] in self.open_orders["option_symbol"].tolist() else margin
-          if self.capital >= margin and (self.capital - options_cost + 0.5 > 0):
-            self.capital -= options_cost + 0.5
-            self.portfolio_value += options_cost
-            if not self.check_option_is_open(row):
-              new_row = pd.DataFrame([row]).dropna(axis=1, how="all")
-              self.open_orders = pd.concat([self.open_orders, new_row], ignore_index=True)
-        elif row["action"] == "S":
-          options_cost = order_size * 100 * buy_price
-          margin = options_cost + 0.1 * strike_price if option_metadata[1] == "C" else options_cost + 0.1 * price
-          # already_existing = self.open_orders[self.open_orders["option_symbol"] == row["option_symbol"]]
-          # if len(already_existing) > 0:
-
-          if self.capital >= margin:
-            self.capital += order_size * buy_price * 100
-
-            if not self.check_option_is_open(row):
-              new_row = pd.DataFrame([row]).dropna(axis=1, how="all")
-              self.open_orders = pd.concat([self.open_orders, new_row], ignore_index=True)
-
-      for _, order in self.open_orders.iterrows():
-        option_metadata = self.parse_option_symbol(order["option_symbol"])
-        if str(order["expiration_date"]) == day_str:
-          order["hour"] = 14 if order["hour"] < 14 else min(row["hour"], 21)
-          if order["hour"] == 14:
-            order["minute"] = 31
-          elif order["hour"] == 21:
-            order["minute"] = 0
-
-          underlying_price = float(self.underlying[
-            (self.underlying["day"] == order["expiration_date"]) &
-            (self.underlying["hour"] == order["hour"]) &
-            (self.underlying["minute"] == order["minute"])
-          ]["price"].iloc[0])
-          put_call = option_metadata[1]
-          strike_price = option_metadata[2]
-          order_size = float(order["order_size"])
-          underlying_cost = strike_price * 100 * order_size
-
-          if order["action"] == "B":
-            if put_call == "C":
-              if underlying_price > strike_price:
-                stock_value = 100 * order_size * underlying_price
-                cost_to_buy = 100 * order_size * strike_price
-                self.capital += stock_value - cost_to_buy
-                self.portfolio_value -= order["order_size"] * 100 * order["running_ask_px_00"]
-            else:
-              if underlying_price < strike_price:
-                stock_value = 100 * order_size * underlying_price
-                cost_to_buy = 100 * order_size * strike_price
-                self.capital += (cost_to_buy - stock_value)
-                self.portfolio_value -= order["order_size"] * 100 * order["running_ask_px_00"]
-          elif order["action"] == "S":
-            if put_call == "C":
-              if underlying_price > strike_price:
-                loss = order_size * 100 * (underlying_price - strike_price)
-                self.capital -= loss
-            else:
-              if underlying_price < strike_price:
-                cost = order_size * 100 * (strike_price - underlying_price)
-                self.capital -= cost
-
-      # go through open orders and see if price of options people are holding have changed
-      for _, order in self.open_orders.iterrows():
-        option_symbol = order["option_symbol"]
-        order_size = float(order["order_size"])
-        
-        current_option_data = self.options[
-          (self.options["symbol"] == option_symbol) & 
-          (self.options["day"] == day_str)
-        ]
-        
-        if not current_option_data.empty:
-          current_option_data = current_option_data.iloc[0]
-        else:
-          continue
-
-        current_bid_price = float(current_option_data["bid_px_00"])
-        current_ask_price = float(current_option_data["ask_px_00"])
-
-        if order["action"] == "B":
-          original_buy_price = float(order["running_ask_px_00"])
-          if current_bid_price > original_buy_price:
-            profit = (current_bid_price - original_buy_price) * 100 * order_size
-            self.portfolio_value += profit
-            
-          else:
-            loss = (original_buy_price - current_bid_price) * 100 * order_size
-            self.portfolio_value -= loss
-          order["running_ask_px_00"] = current_bid_price
-        elif order["action"] == "S":
-          original_sell_price = float(order["running_bid_px_00"])
-          if current_ask_price < original_sell_price:
-            profit = (original_sell_price - current_ask_price) * 100 * order_size
-            self.capital += profit
-          else:
-            loss = (current_ask_price - original_sell_price) * 100 * order_size
-            self.capital -= loss
-          order["running_bid_px_00"] = current_ask_price
-
-      # self.portfolio_value = max(self.portfolio_value, 0)
-      self.open_orders = self.open_orders[self.open_orders["expiration_date"] != day_str]
-
-      current_date += delta
-      self.pnl.append(self.capital + self.portfolio_value)
-      print(str(current_date), "capital:", self.capital, "portfolio value:", self.portfolio_value, "total pnl:", (self.capital + self.portfolio_value), "open orders:", len(self.open_orders))
-
-    last_row = self.underlying.iloc[-1]
-    for _, order in self.open_orders.iterrows():
-      option_metadata = self.parse_option_symbol(order["option_symbol"])
-      current_price = last_row["price"] * 100 * order["order_size"]
-      if order["action"] == "B":
+  def finish(self) -> None:
+    """
+    after the last event: closes out the positions still open and records the final pnl
+    """
+    if isinstance(self.intraday_pnl, np.memmap):
+      self.intraday_pnl.flush()
+
+    for slot in self.open_orders.open_slots():
+      current_price = self.minute_bars.last_price * 100 * self.open_orders.order_size[slot]
+      if self.open_orders.side[slot] == BUY:
         self.portfolio_value += 0.9 * current_price
         self.capital -= current_price
-      elif order["action"] == "S":
+      elif self.open_orders.side[slot] == SELL:
         # self.portfolio_value -= 1.1 * current_price
         self.capital -= 0.1 * current_price
 
     self.pnl.append(self.capital + self.portfolio_value)
-    print("after closing open orders: final capital:", self.capital, "final portfolio value:", self.portfolio_value, "final pnl:", self.pnl[-1])
-
-  def compute_overall_score(self):
-    ptr : int = 0
-    high_point : float = float("-inf")
-    self.max_drawdown = 0.0
+    self.progress.log("final", force=True, capital=self.capital, portfolio_value=self.portfolio_value, pnl=self.pnl[-1])
 
-    while ptr < len(self.pnl):
-      if self.pnl[ptr] > high_point:
-        high_point = self.pnl[ptr]
-      if self.pnl[ptr] < high_point:
-        self.max_drawdown = max(self.max_drawdown, (high_point - self.pnl[ptr]) / high_point)
-      ptr += 1
+  def calculate_pnl(self):
+    # one pass over the tape: quotes, orders and clock ticks are merged in time order
+    with self.instruments.profile(), self.instruments.timer("calculate_pnl"):
+      range_start, range_end, clock_ts = self.start_clock()
+      pending : pd.DataFrame = self.pending_orders(range_start, range_end)
+      self.quotes : LatestQuotes = LatestQuotes(len(SYMBOLS))
+      self.book : OrderBook = OrderBook(len(SYMBOLS))
+      next_tick : int = 0
+
+      stream = self.signals(range_start, range_end)
+      if self.prefetch > 0:
+        stream = prefetch(stream, self.prefetch)
+      for batch, cutoff, orders in stream:
+        pending = self.queue_orders(pending, orders, range_start, range_end)
+        # everything strictly before the batch's last quote is final once the batch is applied
+        n_orders : int = int(np.searchsorted(pending["ts"].to_numpy(), cutoff))
+        n_ticks : int = int(np.searchsorted(clock_ts, cutoff, side="right"))
+        self.replay([] if batch is None else [batch], pending.iloc[:n_orders], clock_ts[:n_ticks], next_tick)
+        pending = pending.iloc[n_orders:]
+        next_tick = max(next_tick, n_ticks)
+      self.replay([], pending, clock_ts, next_tick)
+      self.finish()
+    if self.instruments.enabled:
+      print(self.instruments.summary())
+
+  def trading_days(self) -> int:
+    """
+    SPX sessions between start_date and end_date, the days self.pnl spans: it has a
+    point per session close plus the final liquidation on the last session
+    """
+    return self.calendar.count(self.start_date, self.end_date)
 
-    if self.max_drawdown <= 0:
-      self.max_drawdown = 1 * math.pow(10, -10)
+  def compute_overall_score(self, trading_days: int = None):
+    if trading_days is None:
+      trading_days = self.trading_days()
+    scores = metrics.summary(self.pnl, trading_days, traded=self.traded, initial=self.initial_capital)
 
+    self.max_drawdown = float(scores["max_drawdown"])
     print(f"Max Drawdown: {self.max_drawdown}")
 
-    self.overall_return = 100 * (self.pnl[-1] / 100_000_000)
+    self.overall_return = float(scores["overall_return"])
     print(f"Overall Return: {self.overall_return}%")
 
-    percentage_returns = []
-    prev = 100_000_000
-    for i in range(len(self.pnl)):
-      percentage_returns.append(self.pnl[i] / prev)
-      prev = self.pnl[i]
-
-    avg_return = np.sum(percentage_returns) / 61 # 61 trading days in simulation period
-    std_return = np.std(percentage_returns)
-    
-    if std_return > 0.0:
-      risk_free_rate = 0.03 / 252
-      self.sharpe_ratio = (avg_return - 1 - risk_free_rate) / std_return
+    self.sharpe_ratio = float(scores["sharpe_ratio"])
+    if self.sharpe_ratio != 0.0:
       print(f"Sharpe Ratio: {self.sharpe_ratio}")
     else:
-      self.sharpe_ratio = 0.0
       print("Sharpe Ratio: Undefined (Standard Deviation = 0)")
 
-    self.overall_score = (self.overall_return / self.max_drawdown) * self.sharpe_ratio
+    self.sortino_ratio = float(scores["sortino_ratio"])
+    self.calmar_ratio = float(scores["calmar_ratio"])
+    self.turnover = float(scores["turnover"])
+    self.hit_rate = float(scores["hit_rate"])
+    print(f"Sortino Ratio: {self.sortino_ratio}, Calmar Ratio: {self.calmar_ratio}, Turnover: {self.turnover}, Hit Rate: {self.hit_rate}")
+
+    self.overall_score = float(scores["overall_score"])
     print(f"Overall Score: {self.overall_score}")
 
   def plot_pnl(self):
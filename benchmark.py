@@ -0,0 +1,282 @@
+"""
+Backtester throughput on synthetic SPX option tapes:
+
+  python benchmark.py 10000 1000000 --orders 5000
+
+generates (once) a tape per size under data/bench, times each phase of a run (and
+each strategy's generate_orders) in a fresh process, prints rows/sec and peak memory,
+and appends the results with the git revision to data/bench/results.jsonl, comparing
+against the previous result for the same size. Peak RSS is per phase where the kernel
+can reset it (Linux), otherwise the process's peak so far.
+"""
+
+import io
+import os
+import sys
+import json
+import shutil
+import time
+import resource
+import argparse
+import subprocess
+import contextlib
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List
+from pricing import black_scholes
+
+BENCH_DIR : str = "data/bench"
+RESULTS_PATH : str = "data/bench/results.jsonl"
+START_DATE : str = "2024-01-02"
+END_DATE : str = "2024-03-28"
+
+def tape_paths(n_quotes: int, directory: str = BENCH_DIR) -> Dict[str, str]:
+  # one file name per size, the column cache is keyed on it
+  return {
+    "options": os.path.join(directory, f"options_{n_quotes}.csv"),
+    "minute": os.path.join(directory, f"spx_minute_{n_quotes}.csv"),
+    "hourly": os.path.join(directory, f"spx_hour_{n_quotes}.csv"),
+    "orders": os.path.join(directory, f"orders_{n_quotes}.csv"),
+  }
+
+def listed_expiries(day: pd.Timestamp, sessions: pd.DatetimeIndex) -> np.ndarray:
+  """
+  SPX-like expiry grid on a day: the next week of dailies, Friday weeklies for two
+  months and third-Friday monthlies for six
+  """
+  horizon : pd.DatetimeIndex = pd.bdate_range(day, day + pd.Timedelta(days=183))
+  fridays : pd.DatetimeIndex = horizon[horizon.weekday == 4]
+  third_fridays : pd.DatetimeIndex = fridays[(fridays.day >= 15) & (fridays.day <= 21)]
+  dailies : pd.DatetimeIndex = horizon[:5]
+  weeklies : pd.DatetimeIndex = fridays[fridays <= day + pd.Timedelta(days=61)]
+  return np.unique(np.concatenate([dailies.values, weeklies.values, third_fridays.values])).astype("datetime64[D]")
+
+def generate_tape(n_quotes: int, n_orders: int, directory: str = BENCH_DIR, start: str = START_DATE,
+                  end: str = END_DATE, seed: int = 0) -> Dict[str, str]:
+  """
+  writes a synthetic options tape with n_quotes Black-Scholes priced quotes, n_orders
+  orders sampled from it and matching SPX minute and hourly files. Quotes cluster
+  around the money on 5 point strikes, with a smile and a tick-rounded spread. The tape
+  is written a day at a time so any size fits in memory.
+  """
+  rng : np.random.Generator = np.random.default_rng(seed)
+  paths : Dict[str, str] = tape_paths(n_quotes, directory)
+  os.makedirs(directory, exist_ok=True)
+  sessions : pd.DatetimeIndex = pd.bdate_range(start, end)
+
+  # SPX: a random walk over 391 minutes a session from 09:30 EST
+  steps : np.ndarray = rng.normal(0, 0.0004, (len(sessions), 391))
+  spx : np.ndarray = 4750 * np.exp(np.cumsum(steps.ravel())).reshape(steps.shape)
+  ms_of_day : np.ndarray = 34_200_000 + 60_000 * np.arange(391)
+  dates : np.ndarray = sessions.strftime("%Y%m%d").astype(int).to_numpy()
+  pd.DataFrame({
+    "ms_of_day": np.tile(ms_of_day, len(sessions)),
+    "price": np.round(spx.ravel(), 2),
+    "date": np.repeat(dates, 391),
+  }).to_csv(paths["minute"], index=False)
+
+  hours : np.ndarray = np.minimum(np.arange(391) // 60, 6)
+  hourly : List[Dict] = []
+  for d, day in enumerate(sessions):
+    for hour in range(7):
+      prices : np.ndarray = spx[d, hours == hour]
+      stamp : str = (day + pd.Timedelta(hours=9 + hour, minutes=30)).strftime("%Y-%m-%d %H:%M:%S-05:00")
+      hourly.append({"date": stamp, "open": prices[0], "high": prices.max(), "low": prices.min(), "close": prices[-1],
+                     "adj close": prices[-1], "volume": int(rng.integers(1e8, 3e8))})
+  pd.DataFrame(hourly).to_csv(paths["hourly"], index=False)
+
+  per_day : np.ndarray = np.diff(np.linspace(0, n_quotes, len(sessions) + 1).astype(np.int64))
+  orders_per_day : np.ndarray = np.diff(np.linspace(0, n_orders, len(sessions) + 1).astype(np.int64))
+  for d, day in enumerate(sessions):
+    n : int = int(per_day[d])
+    minute : np.ndarray = np.sort(rng.integers(0, 390 * 60 * 10**9, n)) # ns into the session
+    ts : np.ndarray = day.to_datetime64().astype("datetime64[ns]") + np.timedelta64(14 * 60 + 30, "m") + minute.astype("timedelta64[ns]")
+    spot : np.ndarray = spx[d, minute // (60 * 10**9)]
+
+    # nothing settles past the SPX data
+    expiries : np.ndarray = listed_expiries(day, sessions)
+    expiries = expiries[expiries <= sessions[-1].to_datetime64()]
+    # near expiries quote far more often
+    weights : np.ndarray = 1 / (1 + np.arange(len(expiries)))
+    expiry : np.ndarray = expiries[rng.choice(len(expiries), n, p=weights / weights.sum())]
+    strike : np.ndarray = 5 * np.round(rng.normal(spot, 0.03 * spot) / 5)
+    is_call : np.ndarray = rng.random(n) < 0.5
+    T : np.ndarray = ((expiry - np.datetime64(day.date(), "D")).astype(np.int64) + (390 * 60 * 10**9 - minute) / (390 * 60 * 10**9) / 4) / 365
+    sigma : np.ndarray = 0.12 + 0.8 * np.abs(np.log(strike / spot))
+    value : np.ndarray = np.maximum(black_scholes(spot, strike, T, 0.05, sigma, is_call).price, 0.05)
+    spread : np.ndarray = np.maximum(0.05, np.round(0.02 * value / 0.05) * 0.05)
+    bid : np.ndarray = np.round(np.maximum(value - spread / 2, 0) / 0.05) * 0.05
+    ask : np.ndarray = bid + spread
+
+    code : np.ndarray = pd.DatetimeIndex(expiry).strftime("%y%m%d").to_numpy(dtype=str)
+    symbol : np.ndarray = np.char.add(np.char.add(np.char.add("SPX   ", code), np.where(is_call, "C", "P")),
+                                      np.char.zfill((strike * 1000).astype(np.int64).astype(str), 8))
+    quotes : pd.DataFrame = pd.DataFrame({
+      "ts_recv": np.char.add(np.datetime_as_string(ts), "Z"),
+      "instrument_id": rng.integers(1, 10**6, n),
+      "bid_px_00": np.round(bid, 2),
+      "ask_px_00": np.round(ask, 2),
+      "bid_sz_00": rng.integers(1, 500, n),
+      "ask_sz_00": rng.integers(1, 500, n),
+      "symbol": symbol,
+    })
+    quotes.to_csv(paths["options"], index=False, mode="w" if d == 0 else "a", header=d == 0)
+
+    picked : np.ndarray = np.sort(rng.choice(n, min(int(orders_per_day[d]), n), replace=False))
+    pd.DataFrame({
+      "datetime": quotes["ts_recv"].to_numpy()[picked],
+      "option_symbol": symbol[picked],
+      "action": rng.choice(["B", "S"], len(picked)),
+      "order_size": rng.integers(1, 20, len(picked)),
+    }).to_csv(paths["orders"], index=False, mode="w" if d == 0 else "a", header=d == 0)
+  return paths
+
+def reset_peak_rss() -> bool:
+  """
+  restarts the process's peak RSS from its current RSS (Linux), False where it can't be
+  """
+  try:
+    with open("/proc/self/clear_refs", "w") as f:
+      f.write("5")
+    return True
+  except OSError:
+    return False
+
+def peak_rss_mb() -> float:
+  """
+  peak RSS since the last reset_peak_rss, or since the process started without one
+  """
+  try:
+    with open("/proc/self/status") as f:
+      for line in f:
+        if line.startswith("VmHWM:"):
+          return int(line.split()[1]) / 1024
+  except OSError:
+    pass
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class OrderFile:
+  """
+  up-front strategy replaying an order file
+  """
+
+  def __init__(self, path: str) -> None:
+    self.path : str = path
+
+  def generate_orders(self) -> pd.DataFrame:
+    return pd.read_csv(self.path)
+
+def run_one(n_quotes: int, directory: str = BENCH_DIR) -> Dict:
+  """
+  times one run over the tape of n_quotes, phase by phase, in this process
+  """
+  import david_strategy3
+  import example_strategy
+  import starter_code
+  import Strategy
+  from backtester import Backtester
+  from market_data import DailySnapshots, MarketData, QuoteTape, cache_path, open_cache
+
+  paths : Dict[str, str] = tape_paths(n_quotes, directory)
+  n_orders : int = sum(1 for _ in open(paths["orders"])) - 1
+  phases : Dict[str, Dict] = {}
+  rss_scope : str = "phase"
+
+  @contextlib.contextmanager
+  def phase(name: str, rows: int):
+    nonlocal rss_scope
+    if not reset_peak_rss():
+      rss_scope = "process"
+    start : float = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+      yield
+    seconds : float = time.perf_counter() - start
+    phases[name] = {"seconds": seconds, "rows_per_sec": rows / seconds if seconds > 0 else None, "peak_rss_mb": peak_rss_mb()}
+
+  # ingest is timed cold, from the CSVs
+  csv_paths : tuple = (paths["options"], paths["minute"], paths["hourly"])
+  for path in csv_paths:
+    shutil.rmtree(cache_path(path), ignore_errors=True)
+  with phase("ingest", n_quotes):
+    for path in csv_paths:
+      open_cache(path)
+    DailySnapshots(QuoteTape(paths["options"]))
+  with phase("init", n_orders):
+    market_data : MarketData = MarketData(paths["options"], paths["minute"], paths["hourly"])
+    backtester : Backtester = Backtester(datetime(2024, 1, 1), datetime(2024, 3, 30), OrderFile(paths["orders"]),
+                                         market_data=market_data, progress_interval=None)
+  with phase("calculate_pnl", n_quotes):
+    backtester.calculate_pnl()
+  with phase("compute_overall_score", len(backtester.pnl)):
+    backtester.compute_overall_score()
+
+  # each strategy from construction, which is where most of them read the tape
+  strategies : Dict = {
+    "Strategy": lambda: Strategy.Strategy(START_DATE, END_DATE, paths["options"], paths["hourly"], market_data=market_data, max_quotes=n_quotes),
+    "starter_code": lambda: starter_code.Strategy(market_data=market_data),
+    "david_strategy3": lambda: david_strategy3.Strategy(market_data=market_data, max_quotes=n_quotes),
+    "example_strategy": lambda: example_strategy.Strategy(market_data=market_data),
+  }
+  for name, strategy in strategies.items():
+    with phase(f"generate_orders[{name}]", n_quotes):
+      instance = strategy()
+      # david_strategy3 writes orders.csv to the working directory
+      with contextlib.chdir(directory):
+        instance.generate_orders()
+  return {"n_quotes": n_quotes, "n_orders": n_orders, "phases": phases, "rss_scope": rss_scope, "overall_score": backtester.overall_score}
+
+def git_revision() -> str:
+  try:
+    return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return "unknown"
+
+def previous_result(n_quotes: int, results_path: str):
+  if not os.path.exists(results_path):
+    return None
+  previous = None
+  with open(results_path) as f:
+    for line in f:
+      result : Dict = json.loads(line)
+      if result["n_quotes"] == n_quotes:
+        previous = result
+  return previous
+
+def report(result: Dict, previous) -> None:
+  print(f"{result['n_quotes']:,} quotes, {result['n_orders']:,} orders @ {result['revision']}")
+  peak : str = "peak MB" if result.get("rss_scope") == "phase" else "max MB" # max: the process's peak so far
+  print(f"  {'phase':<36}{'seconds':>10}{'rows/sec':>14}{peak:>10}{'vs prev':>10}")
+  for name, numbers in result["phases"].items():
+    before = previous["phases"].get(name) if previous else None
+    change : str = f"{numbers['seconds'] / before['seconds']:.2f}x" if before and before["seconds"] > 0 else ""
+    rate : str = f"{numbers['rows_per_sec']:,.0f}" if numbers["rows_per_sec"] else ""
+    print(f"  {name:<36}{numbers['seconds']:>10.3f}{rate:>14}{numbers['peak_rss_mb']:>10.0f}{change:>10}")
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="Backtester benchmarks on synthetic SPX option tapes")
+  parser.add_argument("sizes", nargs="*", type=int, default=[10_000, 100_000, 1_000_000], help="quotes per tape")
+  parser.add_argument("--orders", type=int, default=5_000, help="orders per tape")
+  parser.add_argument("--directory", default=BENCH_DIR)
+  parser.add_argument("--results", default=RESULTS_PATH)
+  parser.add_argument("--one", type=int, help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.one is not None:
+    print(json.dumps(run_one(args.one, args.directory)))
+    return
+
+  for n_quotes in args.sizes:
+    if not os.path.exists(tape_paths(n_quotes, args.directory)["orders"]):
+      generate_tape(n_quotes, args.orders, args.directory)
+    # a fresh process per size, so peak RSS is this size's alone
+    child = subprocess.run([sys.executable, os.path.abspath(__file__), "--one", str(n_quotes), "--directory", args.directory],
+                           capture_output=True, text=True, check=True)
+    result : Dict = json.loads(child.stdout.strip().splitlines()[-1])
+    result.update({"revision": git_revision(), "timestamp": datetime.now().isoformat(timespec="seconds")})
+    report(result, previous_result(n_quotes, args.results))
+    with open(args.results, "a") as f:
+      f.write(json.dumps(result) + "\n")
+
+if __name__ == "__main__":
+  main()
@@ -1,20 +1,21 @@
 import pandas as pd
+from market_data import MarketData
 from datetime import datetime
 
 class Strategy:
   
-    def __init__(self) -> None:
+    def __init__(self, market_data: MarketData = None) -> None:
         self.capital : float = 100_000_000
         self.portfolio_value : float = 0
 
         self.start_date : datetime = datetime(2024, 1, 1)
         self.end_date : datetime = datetime(2024, 3, 30)
 
-        self.options : pd.DataFrame = pd.read_csv("data/cleaned_options_data.csv")
-        self.options["day"] = self.options["ts_recv"].apply(lambda x: x.split("T")[0])
+        # shared with the backtester, see Backtester
+        self.market_data : MarketData = market_data if market_data is not None else MarketData()
+        self.options : pd.DataFrame = self.market_data.read_options(iso_timestamps=True, start_date=self.start_date, end_date=self.end_date)
 
-        self.underlying = pd.read_csv("data/underlying_data_hour.csv")
-        self.underlying.columns = self.underlying.columns.str.lower()
+        self.underlying = self.market_data.read_hourly()
 
     def parse_order(self, row) -> dict:
         data = {
@@ -1,4 +1,6 @@
 import pandas as pd
+from market_data import NS_PER_DAY, MarketData, to_ns
+from symbols import SYMBOLS
 import helper
 import pricing
 from heapq import heappush, heappop
@@ -7,54 +9,70 @@ from datetime import datetime
 
 class Strategy:
   
-    def __init__(self) -> None:
+    def __init__(self, market_data: MarketData = None, window: int = 10, min_ask: float = 25, edge: float = 10, max_quotes: int = 20000) -> None:
         self.capital : float = 100_000_000
         self.portfolio_value : float = 0
 
         self.start_date : datetime = datetime(2024, 1, 1)
         self.end_date : datetime = datetime(2024, 3, 30)
 
-        self.options : pd.DataFrame = pd.read_csv("data/cleaned_options_data.csv")
-        self.options["day"] = self.options["ts_recv"].apply(lambda x: x.split("T")[0])
+        # shared with the backtester, see Backtester
+        self.market_data : MarketData = market_data if market_data is not None else MarketData()
+        self.options : pd.DataFrame = self.market_data.read_options(iso_timestamps=True, start_date=self.start_date, end_date=self.end_date)
 
-        self.underlying = pd.read_csv("data/underlying_data_hour.csv")
+        self.underlying = self.market_data.read_hourly()
+        # keyed by hourly bucket, see helper.hour_bucket
         self.hour_data = {}
-        for row in self.underlying.itertuples():
-            self.hour_data[row.date] = {"open" : row.open, "high" : row.high, "low" : row.low, "close" : row.close, "volume" : row.volume}
+        for key, row in zip(helper.hour_keys(self.underlying["date"]).tolist(), self.underlying.itertuples()):
+            if (key < 0):
+                continue
+            self.hour_data[key] = {"open" : row.open, "high" : row.high, "low" : row.low, "close" : row.close, "volume" : row.volume}
         self.underlying = self.hour_data
 
         # earliest possible hour
-        self.prev_hour = "2024-01-02 09:30:00-05:00";
+        self.prev_hour = int(helper.hour_keys(["2024-01-02 09:30:00-05:00"])[0])
 
         # moving average of s&p data
         self.moving_avg = deque()
 
         self.open_orders = {}
 
+        # tunables, see sweep.py
+        self.window : int = window
+        self.min_ask : float = min_ask
+        self.edge : float = edge
+        self.max_quotes : int = max_quotes
+
 
     def generate_orders(self) -> pd.DataFrame:
 
         orders = []
         print("Generating orders...")
         c = 0
-        for row in self.options.itertuples():
 
-            # update moving average of underlying hourly data
-            prev_hour = helper.update_hour(row.ts_recv)
+        # hourly buckets, years to expiry and contract terms for the whole tape at once
+        ts = to_ns(self.options["ts_recv"])
+        hours = helper.hour_buckets(ts).tolist()
+        symbol_ids = SYMBOLS.intern_many(self.options["symbol"])
+        years = helper.years_between_many(ts // NS_PER_DAY, SYMBOLS.expiration_date[symbol_ids]).tolist()
+        is_call = SYMBOLS.is_call[symbol_ids].tolist()
+        strikes = SYMBOLS.strike[symbol_ids].tolist()
+
+        for row, prev_hour, time_to_expiry, call, strike in zip(self.options.itertuples(), hours, years, is_call, strikes):
 
             # TODO: Change c when submitting
-            # if (prev_hour not in self.underlying or prev_hour == "2024-03-01 09:30:00-05:00"):
-            if (prev_hour not in self.underlying or c == 20000):
+            # if (prev_hour not in self.underlying or helper.hour_key(prev_hour) == "2024-03-01 09:30:00-05:00"):
+            if (prev_hour not in self.underlying or c == self.max_quotes):
                 orders = pd.DataFrame(orders)
                 orders.to_csv("orders.csv", index=False)
                 print("Orders generated 1")
                 return orders
 
-            # Update moving average
+            # update moving average of underlying hourly data
             prev_hour_data = self.underlying[prev_hour]
             mid = (prev_hour_data["high"] + prev_hour_data["low"])/2
             self.moving_avg.append(mid)
-            if (len(self.moving_avg) > 10):
+            if (len(self.moving_avg) > self.window):
                 self.moving_avg.popleft()
 
             # Check if any call options are in the money
@@ -69,7 +87,7 @@ class Strategy:
                         "action" : "S",
                         "order_size" : min(row.bid_sz_00, self.open_orders[row.symbol][0])
                     }
-                    print(f"Selling {row.symbol} at {row.bid_px_00} with average price {avg_price} for {order['order_size']})
+                    print(f"Selling {row.symbol} at {row.bid_px_00} with average price {avg_price} for {order['order_size']}")
                     orders.append(order)
                     new_size = self.open_orders[row.symbol][0] - min(order["order_size"], self.open_orders[row.symbol][0])
                     new_price = self.open_orders[row.symbol][1] - min(order["order_size"], self.open_orders[row.symbol][0])*avg_price
@@ -81,23 +99,20 @@ class Strategy:
             # Update moving
             mid = sum(self.moving_avg)/len(self.moving_avg)
             
-            order_data = helper.parse_order(row);
-
-            if (order_data["ask_price"] < 25):
+            if (row.ask_px_00 < self.min_ask):
                 continue
 
             order = {}
 
-            if (order_data["order_type"] == 'C'):
-                time_to_expiry = helper.time_difference_in_years(order_data["date"][:10], order_data["expiry"])
-                expected = pricing.black_scholes_call(mid, order_data["strike"], time_to_expiry)
+            if (call):
+                expected = pricing.black_scholes_call(mid, strike, time_to_expiry)
 
                 """
-                print(f"Current time: {row.ts_recv}, Expiration: {order_data['expiry']}, Years to expiry: {time_to_expiry}")
-                print(f"Stock price: {mid}, Strike price: {order_data['strike']}")
-                print(f"Expected: {expected}, Actual: {order_data['ask_price']}")
+                print(f"Current time: {row.ts_recv}, Years to expiry: {time_to_expiry}")
+                print(f"Stock price: {mid}, Strike price: {strike}")
+                print(f"Expected: {expected}, Actual: {row.ask_px_00}")
                 """
-                if (expected > order_data["ask_price"] + 10):
+                if (expected > row.ask_px_00 + self.edge):
                     order = {
                         "datetime" : row.ts_recv,
                         "option_symbol" : row.symbol,
@@ -107,10 +122,10 @@ class Strategy:
                     print(f"Buying {row.symbol} at {row.ask_px_00} with expected price {expected} for {order['order_size']}")
                     if (row.symbol in self.open_orders):
                         new_size = self.open_orders[row.symbol][0] + order["order_size"]
-                        new_price = self.open_orders[row.symbol][1] + (order_data["ask_price"] * order["order_size"])
+                        new_price = self.open_orders[row.symbol][1] + (row.ask_px_00 * order["order_size"])
                         self.open_orders[row.symbol] = (new_size, new_price)
                     else:
-                        self.open_orders[row.symbol] = (order["order_size"], order_data["ask_price"] * order["order_size"])
+                        self.open_orders[row.symbol] = (order["order_size"], row.ask_px_00 * order["order_size"])
                     orders.append(order)
 
             c += 1
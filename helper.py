@@ -1,45 +1,81 @@
 import numpy as np
+import pandas as pd
 from scipy.stats import norm
 from datetime import datetime, timedelta
+from functools import lru_cache
+from market_data import NS_PER_DAY, to_ns
+from symbols import parse_symbol
+
+# hourly bars start at :30, the last one of the session at 15:30
+NS_PER_HOUR = 3_600_000_000_000
+BUCKET_OFFSET_NS = 30 * 60_000_000_000
+LAST_BUCKET_NS = 15 * NS_PER_HOUR + BUCKET_OFFSET_NS
+EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
+def hour_bucket(ts: int) -> int:
+    """
+    the hourly bar a timestamp (int ns) falls in, as the int ns of its start. Minutes
+    before :30 belong to the previous hour's bar and anything after 16:00 to 15:30.
+    """
+    bucket = (int(ts) - BUCKET_OFFSET_NS) // NS_PER_HOUR * NS_PER_HOUR + BUCKET_OFFSET_NS
+    return min(bucket, bucket // NS_PER_DAY * NS_PER_DAY + LAST_BUCKET_NS)
+
+def hour_buckets(ts: np.ndarray) -> np.ndarray:
+    """
+    hour_bucket over a whole int64 ns column
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    buckets = (ts - BUCKET_OFFSET_NS) // NS_PER_HOUR * NS_PER_HOUR + BUCKET_OFFSET_NS
+    return np.minimum(buckets, buckets // NS_PER_DAY * NS_PER_DAY + LAST_BUCKET_NS)
+
+def hour_key(bucket):
+    """
+    example: the bucket of 2024-01-02 10:30 -> "2024-01-02 10:30:00-05:00", the hourly file's date.
+    Takes an int or numpy int, or an array of buckets (e.g. from hour_buckets) for an array of dates.
+    """
+    if np.ndim(bucket) > 0:
+        seconds = np.asarray(bucket, dtype=np.int64).astype("datetime64[ns]").astype("datetime64[s]")
+        return np.char.add(np.char.replace(np.datetime_as_string(seconds), "T", " "), "-05:00")
+    return (datetime(1970, 1, 1) + timedelta(microseconds=int(bucket) // 1000)).strftime("%Y-%m-%d %H:%M:%S-05:00")
+
+def hour_keys(dates) -> np.ndarray:
+    """
+    the inverse of hour_key over the hourly file's date column: the bucket (int64 ns)
+    each date names, or -1 for dates not at -05:00, which no bucket's key matches
+    """
+    dates = pd.Series(np.asarray(dates, dtype=object)).astype(str)
+    buckets = pd.to_datetime(dates.str[:19], format="%Y-%m-%d %H:%M:%S").to_numpy(dtype="datetime64[ns]").view(np.int64)
+    return np.where(dates.str[19:] == "-05:00", buckets, -1)
 
 def update_hour(timestamp_str: str) -> str:
-    timestamp_str = timestamp_str[:26] + 'Z'
-    timestamp = datetime.strptime(timestamp_str, "%Y-%m-%dT%H:%M:%S.%fZ")
-    
-    # Get the minute part of the timestamp
-    minutes = timestamp.minute
-    
+    return hour_key(hour_bucket(int(to_ns([timestamp_str])[0])))
+
+def epoch_day(day) -> int:
+    """
+    "yyyy-mm-dd", "yymmdd" or a datetime -> days since 1970-01-01
+    """
+    if isinstance(day, datetime):
+        return day.toordinal() - EPOCH_ORDINAL
+    if len(day) == 6:
+        # %y: 69-99 are the 1900s
+        year = int(day[:2])
+        return datetime(year + (1900 if year >= 69 else 2000), int(day[2:4]), int(day[4:6])).toordinal() - EPOCH_ORDINAL
+    return datetime(int(day[:4]), int(day[5:7]), int(day[8:10])).toordinal() - EPOCH_ORDINAL
 
-    # Determine if it should be rounded down to :00 or :30
-    if minutes < 30:
-        # Round down to :00
-        rounded_timestamp = timestamp.replace(minute=30, second=0, microsecond=0)
-        rounded_timestamp -= timedelta(hours=1)
-        if (rounded_timestamp.hour >= 16):
-            rounded_timestamp = rounded_timestamp.replace(hour=15)
-    else:
-        # Round down to :30
-        rounded_timestamp = timestamp.replace(minute=30, second=0, microsecond=0)
-        if (rounded_timestamp.hour >= 16):
-            rounded_timestamp = rounded_timestamp.replace(hour=15)
-    
-    formatted_date = rounded_timestamp.strftime("%Y-%m-%d %H:%M:%S-05:00")
-    return formatted_date
+def years_between(day1: int, day2: int) -> float:
+    # Considering leap years
+    return abs(day1 - day2) / 365.25
 
-def time_difference_in_years(date1: str, date2: str) -> float:
-    # Parse the first date formatted as "yyyy-mm-dd"
-    date1_parsed = datetime.strptime(date1, "%Y-%m-%d")
-    
-    # Parse the second date formatted as "yymmdd"
-    date2_parsed = datetime.strptime(date2, "%y%m%d")
-    
-    # Calculate the difference in days
-    difference_in_days = abs((date1_parsed - date2_parsed).days)
-    
-    # Convert days to years
-    difference_in_years = difference_in_days / 365.25  # Considering leap years
-    
-    return difference_in_years
+def years_between_many(days1, days2) -> np.ndarray:
+    """
+    years_between over arrays of day ordinals (ints or datetime64[D])
+    """
+    return np.abs(np.asarray(days1).astype(np.int64) - np.asarray(days2).astype(np.int64)) / 365.25
+
+@lru_cache(maxsize=1 << 16)
+def time_difference_in_years(date1: str, date2) -> float:
+    # date1 is formatted as "yyyy-mm-dd", date2 as "yymmdd" unless it is already a parsed expiry
+    return years_between(epoch_day(date1), epoch_day(date2))
 
 def parse_order(row) -> dict:
     """
@@ -47,18 +83,16 @@ def parse_order(row) -> dict:
         "bid_size" : row["bid_sz_00"],
         "ask_size" : row["ask_sz_00"],
     """
+    symbol = parse_symbol(row.symbol)
     data = {
         "bid_price" : row.bid_px_00,
         "ask_price" : row.ask_px_00,
         "date" : row.ts_recv,
-        "expiry" : row.symbol[6:12],
-        "order_type" : row.symbol[12],
-        "strike" : float(row.symbol[13:18])
+        "expiry" : symbol.expiry,
+        "order_type" : symbol.put_call,
+        "strike" : symbol.strike
     }
 
-    for i in range(3):
-        data["strike"] += float(row.symbol[18+i]) / 10**(i+1)
-
     return data
 
 
@@ -0,0 +1,90 @@
+import time
+import cProfile
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+# shared by every disabled timer, so a disabled `with instruments.timer(...)` costs one call
+NULL_TIMER = nullcontext()
+
+class Timer:
+  __slots__ = ("instruments", "name", "start")
+
+  def __init__(self, instruments, name: str) -> None:
+    self.instruments = instruments
+    self.name : str = name
+
+  def __enter__(self) -> None:
+    self.start : float = time.perf_counter()
+
+  def __exit__(self, *exc) -> None:
+    self.instruments.add_time(self.name, time.perf_counter() - self.start)
+
+class Instruments:
+  """
+  Named wall-clock timers and counters for the phases of a run. Disabled instruments
+  hand out a shared no-op timer and ignore counts, so they can stay in hot paths.
+  """
+
+  def __init__(self, enabled: bool = False, profile_path: Optional[str] = None) -> None:
+    self.enabled : bool = enabled
+    self.profile_path : Optional[str] = profile_path
+    self.seconds : Dict[str, float] = {}
+    self.calls : Dict[str, int] = {}
+    self.counters : Dict[str, int] = {}
+
+  def timer(self, name: str):
+    return Timer(self, name) if self.enabled else NULL_TIMER
+
+  def add_time(self, name: str, seconds: float) -> None:
+    self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+    self.calls[name] = self.calls.get(name, 0) + 1
+
+  def count(self, name: str, n: int = 1) -> None:
+    if self.enabled:
+      self.counters[name] = self.counters.get(name, 0) + n
+
+  @contextmanager
+  def profile(self):
+    """
+    runs the block under cProfile and dumps pstats to profile_path, when one is set
+    """
+    if self.profile_path is None:
+      yield
+      return
+    profiler : cProfile.Profile = cProfile.Profile()
+    profiler.enable()
+    try:
+      yield
+    finally:
+      profiler.disable()
+      profiler.dump_stats(self.profile_path)
+
+  def summary(self) -> str:
+    """
+    one line per timer, slowest first, then the counters
+    """
+    lines : List[str] = [f"{'phase':<16}{'calls':>10}{'seconds':>12}{'us/call':>12}"]
+    for name, seconds in sorted(self.seconds.items(), key=lambda item: -item[1]):
+      lines.append(f"{name:<16}{self.calls[name]:>10}{seconds:>12.4f}{1e6 * seconds / self.calls[name]:>12.1f}")
+    for name, value in self.counters.items():
+      lines.append(f"{name:<16}{value:>10}")
+    return "\n".join(lines)
+
+class ProgressLog:
+  """
+  Structured key=value progress lines, at most one per interval seconds (every line
+  with interval 0, none with interval None). Lines with force are always written.
+  """
+
+  def __init__(self, interval: Optional[float] = 0.0) -> None:
+    self.interval : Optional[float] = interval
+    self.last : float = float("-inf")
+
+  def log(self, event: str, force: bool = False, **fields) -> None:
+    if self.interval is None:
+      return
+    now : float = time.monotonic()
+    if not force and now - self.last < self.interval:
+      return
+    self.last = now
+    print(event, " ".join(f"{name}={value}" for name, value in fields.items()))
@@ -0,0 +1,654 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from symbols import SYMBOLS, SymbolTable
+
+NS_PER_DAY : int = 86_400_000_000_000
+
+OPTIONS_CSV : str = "data/cleaned_options_data.csv"
+UNDERLYING_CSV : str = "data/spx_minute_level_data_jan_mar_2024.csv"
+HOURLY_CSV : str = "data/underlying_data_hour.csv"
+CACHE_DIR : str = "data/cache"
+CACHE_VERSION : int = 2
+TIMESTAMP_COLUMNS : tuple = ("ts_recv",)
+CHUNK_ROWS : int = 1 << 18
+
+# byte layout of the tape's timestamps: 2024-02-15T18:26:43.789451230Z
+ISO_NS_SEPARATORS : Dict[int, str] = {4: "-", 7: "-", 10: "T", 13: ":", 16: ":", 19: ".", 29: "Z"}
+ISO_NS_DIGITS : np.ndarray = np.array([i for i in range(29) if i not in ISO_NS_SEPARATORS])
+
+def parse_iso_ns(timestamps) -> Tuple[np.ndarray, np.ndarray]:
+  """
+  the fast path of to_ns: (int64 ns, mask) for timestamps in the tape's fixed-width
+  format, decoded straight from their bytes. Rows outside the mask are in some other
+  format (or no date at all) and their ns values are meaningless.
+  """
+  try:
+    raw : np.ndarray = np.asarray(timestamps).astype("S31")
+  except (UnicodeEncodeError, ValueError):
+    return np.zeros(len(timestamps), dtype=np.int64), np.zeros(len(timestamps), dtype=bool)
+  chars : np.ndarray = raw.view(np.uint8).reshape(len(raw), 31)
+  digits : np.ndarray = chars[:, ISO_NS_DIGITS].astype(np.int64) - ord("0")
+  ok : np.ndarray = (chars[:, 30] == 0) & ((digits >= 0) & (digits <= 9)).all(axis=1)
+  for position, separator in ISO_NS_SEPARATORS.items():
+    ok &= chars[:, position] == ord(separator)
+  digits[~ok] = 0
+
+  def number(first: int, width: int) -> np.ndarray:
+    return digits[:, first:first + width] @ (10 ** np.arange(width - 1, -1, -1))
+
+  year, month, day = number(0, 4), np.clip(number(4, 2), 1, 99), number(6, 2)
+  hour, minute, second = number(8, 2), number(10, 2), number(12, 2)
+  months : np.ndarray = ((year - 1970) * 12 + month - 1).astype("datetime64[M]")
+  month_days : np.ndarray = ((months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.int64)
+  ok &= (month <= 12) & (day >= 1) & (day <= month_days) & (hour <= 23) & (minute <= 59) & (second <= 59)
+  days : np.ndarray = months.astype("datetime64[D]").astype(np.int64) + day - 1
+  return days * NS_PER_DAY + ((hour * 60 + minute) * 60 + second) * 1_000_000_000 + number(14, 9), ok
+
+def to_ns(timestamps, errors: str = "raise") -> np.ndarray:
+  """
+  example: 2024-02-15T18:26:43.789451230Z -> int64 nanoseconds since epoch (UTC)
+  already parsed datetime64[ns] values are passed through as a view. Timestamps in
+  that fixed-width format are decoded directly, only the others go through pandas;
+  with errors="coerce" unparseable ones come back as NaT (the int64 minimum).
+  """
+  values = np.asarray(timestamps)
+  if values.dtype == np.dtype("datetime64[ns]"):
+    return values.view(np.int64)
+  if values.dtype.kind not in "OSU" or len(values) == 0:
+    return parse_with_pandas(timestamps, errors)
+  ns, ok = parse_iso_ns(values)
+  if not ok.all():
+    ns[~ok] = parse_with_pandas(values[~ok], errors)
+  return ns
+
+def parse_with_pandas(timestamps, errors: str) -> np.ndarray:
+  parsed = pd.to_datetime(pd.Series(timestamps), utc=True, format="ISO8601", errors=errors)
+  return parsed.dt.tz_localize(None).to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+def cache_path(csv_path: str, cache_dir: str = CACHE_DIR) -> str:
+  return os.path.join(cache_dir, os.path.splitext(os.path.basename(csv_path))[0])
+
+def build_cache(csv_path: str, cache_dir: str = CACHE_DIR, chunk_rows: int = CHUNK_ROWS) -> str:
+  """
+  one-time ingest of a CSV into typed .npy columns. Timestamp columns are stored as
+  int64 nanoseconds next to their fixed-width ISO text, text columns as int32 codes
+  into a sorted category table, numeric columns as is. Rows are (stably) sorted by
+  the first timestamp column so the cache can be streamed in time order. The metadata
+  file is written last, so an interrupted build is simply redone on the next load.
+
+  The CSV is read chunk_rows at a time and the columns are assembled in memory-mapped
+  files, so only the sort order (8 bytes a row, skipped for an already sorted tape) is
+  ever held in memory for the whole file.
+  """
+  target : str = cache_path(csv_path, cache_dir)
+  parts : str = os.path.join(target, "parts")
+  os.makedirs(parts, exist_ok=True)
+
+  kinds : Dict[str, str] = {}
+  dtypes : Dict[str, np.dtype] = {}
+  categories : Dict[str, Dict[str, int]] = {} # text column -> value -> code in order of first sight
+  n_rows : int = 0
+  n_chunks : int = 0
+  ordered : bool = True
+  last_ts : Optional[int] = None
+
+  for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+    for name in chunk.columns:
+      column : pd.Series = chunk[name]
+      if name in TIMESTAMP_COLUMNS:
+        kinds.setdefault(name, "timestamp")
+        arrays : Dict[str, np.ndarray] = {name: to_ns(column), name + ".iso": column.to_numpy(dtype=str).astype(bytes)}
+      elif kinds.setdefault(name, "category" if column.dtype == object else "numeric") == "category":
+        codes, uniques = pd.factorize(column)
+        seen : Dict[str, int] = categories.setdefault(name, {})
+        lookup : np.ndarray = np.array([seen.setdefault(value, len(seen)) for value in uniques], dtype=np.int32)
+        arrays = {name + ".codes": np.where(codes >= 0, lookup[np.maximum(codes, 0)] if len(lookup) else -1, -1).astype(np.int32)}
+      else:
+        arrays = {name: column.to_numpy()}
+      for key, array in arrays.items():
+        np.save(os.path.join(parts, f"{key}.{n_chunks}.npy"), array)
+        dtypes[key] = np.result_type(dtypes[key], array.dtype) if key in dtypes else array.dtype
+
+    timestamps = [name for name in chunk.columns if name in TIMESTAMP_COLUMNS]
+    if timestamps and len(chunk):
+      ts : np.ndarray = np.load(os.path.join(parts, f"{timestamps[0]}.{n_chunks}.npy"))
+      ordered = ordered and (last_ts is None or ts[0] >= last_ts) and bool(np.all(ts[1:] >= ts[:-1]))
+      last_ts = int(ts[-1])
+    n_rows += len(chunk)
+    n_chunks += 1
+
+  # category codes were handed out in order of first sight, remap them to sorted order
+  remaps : Dict[str, np.ndarray] = {}
+  for name, seen in categories.items():
+    values : np.ndarray = np.asarray(list(seen), dtype=str)
+    order : np.ndarray = np.argsort(values, kind="stable")
+    np.save(os.path.join(target, name + ".categories.npy"), values[order])
+    remaps[name + ".codes"] = np.empty(len(values), dtype=np.int32)
+    remaps[name + ".codes"][order] = np.arange(len(values), dtype=np.int32)
+
+  def concatenate(key: str, path: str) -> np.ndarray:
+    column : np.ndarray = np.lib.format.open_memmap(path, mode="w+", dtype=dtypes[key], shape=(n_rows,))
+    offset : int = 0
+    for k in range(n_chunks):
+      part : np.ndarray = np.load(os.path.join(parts, f"{key}.{k}.npy"))
+      if key in remaps and len(remaps[key]):
+        part = np.where(part >= 0, remaps[key][np.maximum(part, 0)], -1).astype(np.int32)
+      column[offset:offset + len(part)] = part
+      offset += len(part)
+    return column
+
+  sort_key = next((name for name in kinds if kinds[name] == "timestamp"), None)
+  rows : Optional[np.ndarray] = None
+  if sort_key is not None and not ordered:
+    rows = np.argsort(concatenate(sort_key, os.path.join(parts, "sort_key.npy")), kind="stable")
+
+  for key in dtypes:
+    if rows is None:
+      concatenate(key, os.path.join(target, key + ".npy")).flush()
+      continue
+    staged : np.ndarray = concatenate(key, os.path.join(parts, key + ".staged.npy"))
+    column : np.ndarray = np.lib.format.open_memmap(os.path.join(target, key + ".npy"), mode="w+", dtype=dtypes[key], shape=(n_rows,))
+    for begin in range(0, n_rows, chunk_rows):
+      column[begin:begin + chunk_rows] = staged[rows[begin:begin + chunk_rows]]
+    column.flush()
+    del staged, column
+  shutil.rmtree(parts)
+
+  stat = os.stat(csv_path)
+  with open(os.path.join(target, "meta.json"), "w") as f:
+    json.dump({"version": CACHE_VERSION, "source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns, "columns": kinds}, f)
+  return target
+
+def open_cache(csv_path: str, cache_dir: str = CACHE_DIR) -> Tuple[str, dict]:
+  """
+  cache directory and metadata for a CSV, (re)building the cache when it is missing,
+  from an older cache version or older than the CSV
+  """
+  target : str = cache_path(csv_path, cache_dir)
+  meta_path : str = os.path.join(target, "meta.json")
+  meta : Optional[dict] = None
+  if os.path.exists(meta_path):
+    with open(meta_path) as f:
+      meta = json.load(f)
+  if os.path.exists(csv_path):
+    stat = os.stat(csv_path)
+    source : tuple = (CACHE_VERSION, stat.st_size, stat.st_mtime_ns)
+    if meta is None or (meta.get("version"), meta["source_size"], meta["source_mtime_ns"]) != source:
+      build_cache(csv_path, cache_dir)
+      with open(meta_path) as f:
+        meta = json.load(f)
+  if meta is None:
+    raise FileNotFoundError(csv_path)
+  return target, meta
+
+def day_range(start_date=None, end_date=None) -> Tuple[Optional[int], Optional[int]]:
+  """
+  example: (2024-01-02, 2024-01-03) -> [2024-01-02 00:00, 2024-01-04 00:00) as int64 ns,
+  None for an open end
+  """
+  start : Optional[int] = None if start_date is None else to_epoch_day(start_date) * NS_PER_DAY
+  end : Optional[int] = None if end_date is None else (to_epoch_day(end_date) + 1) * NS_PER_DAY
+  return start, end
+
+def load_columns(csv_path: str, cache_dir: str = CACHE_DIR, iso_timestamps: bool = False,
+                 start: Optional[int] = None, end: Optional[int] = None) -> Dict:
+  """
+  memory-mapped columns of a CSV through the cache. Timestamps come back as
+  datetime64[ns], or as the original ISO strings with iso_timestamps, and text
+  columns as pd.Categorical. start / end (int64 ns) keep only the rows with
+  start <= timestamp < end, without touching the rest of the file.
+  """
+  target, meta = open_cache(csv_path, cache_dir)
+  rows : slice = slice(None)
+  sort_key = next((name for name, kind in meta["columns"].items() if kind == "timestamp"), None)
+  if sort_key is not None and (start is not None or end is not None):
+    ts : np.ndarray = np.load(os.path.join(target, sort_key + ".npy"), mmap_mode="r")
+    rows = slice(0 if start is None else int(np.searchsorted(ts, start)), len(ts) if end is None else int(np.searchsorted(ts, end)))
+
+  columns : Dict = {}
+  for name, kind in meta["columns"].items():
+    if kind == "timestamp" and iso_timestamps:
+      columns[name] = np.load(os.path.join(target, name + ".iso.npy"), mmap_mode="r")[rows].astype(str).astype(object)
+    elif kind == "timestamp":
+      columns[name] = np.load(os.path.join(target, name + ".npy"), mmap_mode="r")[rows].view("datetime64[ns]")
+    elif kind == "category":
+      codes : np.ndarray = np.load(os.path.join(target, name + ".codes.npy"), mmap_mode="r")[rows]
+      categories : np.ndarray = np.load(os.path.join(target, name + ".categories.npy"))
+      columns[name] = pd.Categorical.from_codes(codes, categories, validate=False)
+    else:
+      columns[name] = np.load(os.path.join(target, name + ".npy"), mmap_mode="r")[rows]
+  return columns
+
+def read_options(csv_path: str = OPTIONS_CSV, iso_timestamps: bool = False, start_date=None, end_date=None) -> pd.DataFrame:
+  """
+  the options tape through the column cache, a drop-in for pd.read_csv(csv_path)
+  (ts_recv is datetime64[ns] unless iso_timestamps is set). With start_date / end_date
+  only the quotes from those days (inclusive) are read.
+  """
+  start, end = day_range(start_date, end_date)
+  return pd.DataFrame(load_columns(csv_path, iso_timestamps=iso_timestamps, start=start, end=end), copy=False)
+
+def read_underlying(csv_path: str = UNDERLYING_CSV) -> pd.DataFrame:
+  underlying : pd.DataFrame = pd.DataFrame(load_columns(csv_path), copy=False)
+  underlying.columns = underlying.columns.str.lower()
+  return underlying
+
+# minute-of-day bounds of the SPX session on the UTC-5 clock the tape uses (09:31 -> 16:00 EST)
+SESSION_OPEN : int = 14 * 60 + 31
+SESSION_CLOSE : int = 21 * 60
+SESSION_MINUTES : int = SESSION_CLOSE - SESSION_OPEN + 1
+
+def to_epoch_day(day) -> int:
+  """
+  example: "2024-02-16" -> days since 1970-01-01, ints already are and pass through
+  """
+  if isinstance(day, (int, np.integer)):
+    return int(day)
+  return int(np.datetime64(day, "D").astype(np.int64))
+
+class Bar(NamedTuple):
+  ts : int # start of the minute, int64 ns on the tape clock
+  price : float
+
+class MinuteBars:
+  """
+  SPX minute prices as a contiguous (trading day ordinal, minute of session) array.
+  Times outside the session are clamped to its first/last bar, and missing bars are
+  filled from the nearest earlier bar of the same day (the first bar for a leading gap).
+  """
+
+  def __init__(self, underlying: pd.DataFrame) -> None:
+    days : np.ndarray = pd.to_datetime(underlying["date"].astype(str), format="%Y%m%d").to_numpy(dtype="datetime64[D]").view(np.int64)
+    minute_of_day : np.ndarray = underlying["ms_of_day"].to_numpy(dtype=np.int64) // 60_000 + 5 * 60 # + 5 to account for UTC->EST
+    price : np.ndarray = underlying["price"].to_numpy(dtype=np.float64)
+
+    self.days : np.ndarray = np.unique(days)
+    self.first_day : int = int(self.days[0])
+    self.ordinals : np.ndarray = np.full(int(self.days[-1]) - self.first_day + 1, -1, dtype=np.int64)
+    self.ordinals[self.days - self.first_day] = np.arange(len(self.days))
+
+    grid : np.ndarray = np.full((len(self.days), SESSION_MINUTES), np.nan)
+    inside : np.ndarray = (minute_of_day >= SESSION_OPEN) & (minute_of_day <= SESSION_CLOSE)
+    grid[self.ordinals[days[inside] - self.first_day], minute_of_day[inside] - SESSION_OPEN] = price[inside]
+    grid = pd.DataFrame(grid).ffill(axis=1).bfill(axis=1).to_numpy()
+    self.prices : np.ndarray = np.ascontiguousarray(grid)
+    self.last_price : float = float(price[-1])
+
+  def __len__(self) -> int:
+    return len(self.days)
+
+  @staticmethod
+  def clamp(hour, minute):
+    """
+    minute of session for an hour/minute on the tape clock, clamped to [14:31, 21:00]
+    """
+    return np.clip(np.asarray(hour) * 60 + np.asarray(minute), SESSION_OPEN, SESSION_CLOSE) - SESSION_OPEN
+
+  def ordinal_many(self, epoch_days: np.ndarray) -> np.ndarray:
+    """
+    trading day ordinals for days since epoch, -1 for days without bars
+    """
+    offset : np.ndarray = np.asarray(epoch_days, dtype=np.int64) - self.first_day
+    inside : np.ndarray = (offset >= 0) & (offset < len(self.ordinals))
+    return np.where(inside, self.ordinals[np.where(inside, offset, 0)], -1)
+
+  def ordinal(self, day) -> int:
+    ordinal = int(self.ordinal_many(np.array([to_epoch_day(day)]))[0])
+    if ordinal < 0:
+      raise KeyError(f"no SPX minute bars for {day}")
+    return ordinal
+
+  def price(self, day, hour: int, minute: int) -> float:
+    return float(self.prices[self.ordinal(day), self.clamp(hour, minute)])
+
+  def minutes(self, start: Optional[int] = None, end: Optional[int] = None) -> slice:
+    """
+    positions in the flattened prices of the session minutes with start <= ts < end
+    """
+    ts : np.ndarray = self.timestamps()
+    return slice(0 if start is None else int(np.searchsorted(ts, start)), len(ts) if end is None else int(np.searchsorted(ts, end)))
+
+  def timestamps(self) -> np.ndarray:
+    """
+    start of every session minute as int64 ns, in the order of prices.ravel()
+    """
+    return (self.days[:, None] * 1440 + SESSION_OPEN + np.arange(SESSION_MINUTES)).ravel() * 60_000_000_000
+
+  def bars(self, start: Optional[int] = None, end: Optional[int] = None) -> Iterator[Bar]:
+    """
+    every session minute with start <= ts < end (int64 ns) in time order
+    """
+    minutes : slice = self.minutes(start, end)
+    for bar_ts, price in zip(self.timestamps()[minutes].tolist(), self.prices.ravel()[minutes].tolist()):
+      yield Bar(bar_ts, price)
+
+  def prices_at(self, ts: np.ndarray) -> np.ndarray:
+    """
+    vectorized lookup for int64 nanosecond timestamps, NaN on days without bars
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    ordinals : np.ndarray = self.ordinal_many(ts // NS_PER_DAY)
+    minutes : np.ndarray = self.clamp(0, (ts % NS_PER_DAY) // 60_000_000_000)
+    return np.where(ordinals >= 0, self.prices[np.maximum(ordinals, 0), minutes], np.nan)
+
+class TradingCalendar:
+  """
+  Trading sessions as sorted days since epoch, taken from the days the SPX minute
+  data has bars for, so weekends, holidays and missing days are never sessions. Dates
+  may be anything to_epoch_day takes (date strings, datetimes or days since epoch).
+  """
+
+  def __init__(self, days: np.ndarray) -> None:
+    self.days : np.ndarray = np.unique(np.asarray(days, dtype=np.int64))
+
+  def __len__(self) -> int:
+    return len(self.days)
+
+  def sessions(self, start, end) -> np.ndarray:
+    """
+    sessions from start to end, both inclusive
+    """
+    lo : int = int(np.searchsorted(self.days, to_epoch_day(start)))
+    hi : int = int(np.searchsorted(self.days, to_epoch_day(end), side="right"))
+    return self.days[lo:hi]
+
+  def count(self, start, end) -> int:
+    return len(self.sessions(start, end))
+
+class QuoteTape:
+  """
+  The options tape as time-sorted, memory-mapped columns straight from the column
+  cache. Batches are slices of the memory maps, so streaming the tape only reads the
+  pages each batch touches and memory use does not grow with the tape.
+  """
+
+  columns : tuple = ("ts_recv", "bid_px_00", "ask_px_00", "bid_sz_00", "ask_sz_00")
+
+  def __init__(self, csv_path: str = OPTIONS_CSV, symbols: SymbolTable = SYMBOLS, cache_dir: str = CACHE_DIR) -> None:
+    target, meta = open_cache(csv_path, cache_dir)
+    self.cache_target : str = target
+    self.cache_meta : dict = meta
+    # plain ndarray views of the maps: slicing an np.memmap goes through Python code
+    for name in self.columns:
+      setattr(self, name, np.load(os.path.join(target, name + ".npy"), mmap_mode="r").view(np.ndarray))
+    self.symbol_codes : np.ndarray = np.load(os.path.join(target, "symbol.codes.npy"), mmap_mode="r").view(np.ndarray)
+    # cache category code -> id in the shared symbol table
+    self.symbol_ids : np.ndarray = symbols.intern_many(np.load(os.path.join(target, "symbol.categories.npy")))
+
+  def __len__(self) -> int:
+    return len(self.ts_recv)
+
+  def batches(self, start: Optional[int] = None, end: Optional[int] = None, batch_size: int = 1 << 16) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    quotes with start <= ts_recv < end (int64 ns) in time order, batch_size rows at a time;
+    rows without a symbol (code -1 in the cache) are left out
+    """
+    lo : int = 0 if start is None else int(np.searchsorted(self.ts_recv, start))
+    hi : int = len(self) if end is None else int(np.searchsorted(self.ts_recv, end))
+    for begin in range(lo, hi, batch_size):
+      stop : int = min(begin + batch_size, hi)
+      batch : Dict[str, np.ndarray] = {name: getattr(self, name)[begin:stop] for name in self.columns}
+      codes : np.ndarray = self.symbol_codes[begin:stop]
+      if codes.min() < 0:
+        # indexing symbol_ids with -1 would pick the last symbol
+        keep : np.ndarray = codes >= 0
+        batch = {name: column[keep] for name, column in batch.items()}
+        codes = codes[keep]
+      batch["symbol_id"] = self.symbol_ids[codes]
+      yield batch
+
+class LatestQuotes:
+  """
+  Per-symbol quote state while streaming the tape: the latest quote for every symbol
+  id, updated one run of quotes at a time.
+  """
+
+  def __init__(self, n_symbols: int) -> None:
+    self.ts_recv : np.ndarray = np.full(n_symbols, -1, dtype=np.int64)
+    self.bid_px_00 : np.ndarray = np.zeros(n_symbols)
+    self.ask_px_00 : np.ndarray = np.zeros(n_symbols)
+    self.bid_sz_00 : np.ndarray = np.zeros(n_symbols)
+    self.ask_sz_00 : np.ndarray = np.zeros(n_symbols)
+
+  def __len__(self) -> int:
+    return len(self.ts_recv)
+
+  def grow(self, n_symbols: int) -> None:
+    """
+    makes room for symbol ids interned after the run started, with no quote yet
+    """
+    extra : int = n_symbols - len(self.ts_recv)
+    if extra <= 0:
+      return
+    self.ts_recv = np.concatenate([self.ts_recv, np.full(extra, -1, dtype=np.int64)])
+    for name in ("bid_px_00", "ask_px_00", "bid_sz_00", "ask_sz_00"):
+      setattr(self, name, np.concatenate([getattr(self, name), np.zeros(extra)]))
+
+  def update(self, batch: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    applies a time-sorted run of quotes that does not cross midnight, returns the
+    distinct symbol ids it touched
+    """
+    symbol_ids : np.ndarray = batch["symbol_id"]
+    if len(symbol_ids) == 0:
+      return symbol_ids
+    updated, reversed_index = np.unique(symbol_ids[::-1], return_index=True)
+    last : np.ndarray = len(symbol_ids) - 1 - reversed_index
+    if updated[0] < 0:
+      # rows without a symbol sort first, -1 would index the last symbol's slot
+      updated, last = updated[1:], last[1:]
+    for name in ("ts_recv", "bid_px_00", "ask_px_00", "bid_sz_00", "ask_sz_00"):
+      getattr(self, name)[updated] = batch[name][last]
+    return updated
+
+  def has_quote_on(self, symbol_id: int, day: int) -> bool:
+    return symbol_id >= 0 and self.ts_recv[symbol_id] // NS_PER_DAY == day
+
+# DailySnapshots kinds
+SNAPSHOTS : tuple = ("open", "last", "close")
+SNAPSHOT_COLUMNS : tuple = ("day", "symbol_code") + tuple(f"{kind}_{side}" for kind in SNAPSHOTS for side in ("bid_px_00", "ask_px_00"))
+
+def build_snapshots(tape: QuoteTape) -> None:
+  """
+  writes the daily snapshots of a tape into its cache directory, one day of quotes at
+  a time: the day's rows are grouped by symbol with a stable sort, which keeps each
+  group in time order, so its first and last rows are the open and last quotes and the
+  close is the last row at or before the session close; rows without a symbol
+  (code -1) are skipped
+  """
+  ts : np.ndarray = tape.ts_recv
+  columns : Dict[str, List[np.ndarray]] = {name: [] for name in SNAPSHOT_COLUMNS}
+  if len(ts) > 0:
+    days : np.ndarray = np.arange(int(ts[0]) // NS_PER_DAY, int(ts[-1]) // NS_PER_DAY + 1)
+    bounds : np.ndarray = np.searchsorted(ts, np.append(days, days[-1] + 1) * NS_PER_DAY)
+    for day, lo, hi in zip(days.tolist(), bounds[:-1].tolist(), bounds[1:].tolist()):
+      if lo == hi:
+        continue
+      order : np.ndarray = lo + np.argsort(tape.symbol_codes[lo:hi], kind="stable")
+      codes : np.ndarray = tape.symbol_codes[order]
+      missing : int = int(np.searchsorted(codes, 0))
+      if missing == len(order):
+        continue
+      order, codes = order[missing:], codes[missing:]
+      starts : np.ndarray = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+      ends : np.ndarray = np.r_[starts[1:], len(order)]
+      before_close : np.ndarray = np.add.reduceat(ts[order] <= day * NS_PER_DAY + SESSION_CLOSE * 60_000_000_000, starts)
+      closed : np.ndarray = before_close > 0
+      rows : Dict[str, np.ndarray] = {"open": order[starts], "last": order[ends - 1], "close": order[starts + np.maximum(before_close, 1) - 1]}
+
+      columns["day"].append(np.full(len(starts), day, dtype=np.int64))
+      columns["symbol_code"].append(codes[starts])
+      for kind in SNAPSHOTS:
+        for side in ("bid_px_00", "ask_px_00"):
+          prices : np.ndarray = getattr(tape, side)[rows[kind]].astype(np.float64)
+          columns[f"{kind}_{side}"].append(np.where(closed, prices, np.nan) if kind == "close" else prices)
+
+  for name in SNAPSHOT_COLUMNS:
+    values : np.ndarray = np.concatenate(columns[name]) if columns[name] else np.array([], dtype=np.int64 if name == "day" else np.float64)
+    np.save(os.path.join(tape.cache_target, f"snapshot.{name}.npy"), values)
+  # written last, like the cache's own meta.json
+  with open(os.path.join(tape.cache_target, "snapshot.json"), "w") as f:
+    json.dump({name: tape.cache_meta[name] for name in ("version", "source_size", "source_mtime_ns")}, f)
+
+class DailySnapshots:
+  """
+  Open, last and close bid/ask of every symbol on every day it quoted: its first quote
+  of the day, its last one, and its last one at or before the 16:00 EST close (NaN if
+  it only quoted after). Built once per tape with a grouped pass (build_snapshots) and
+  kept in the column cache, next to the tape. Rows are sorted by (day, symbol id), so
+  the snapshot of many symbols on a day is a binary search each.
+  """
+
+  def __init__(self, tape: QuoteTape) -> None:
+    meta_path : str = os.path.join(tape.cache_target, "snapshot.json")
+    current : bool = False
+    if os.path.exists(meta_path):
+      with open(meta_path) as f:
+        meta : dict = json.load(f)
+      current = all(meta.get(name) == tape.cache_meta[name] for name in ("version", "source_size", "source_mtime_ns"))
+    if not current:
+      build_snapshots(tape)
+
+    columns : Dict[str, np.ndarray] = {name: np.load(os.path.join(tape.cache_target, f"snapshot.{name}.npy")) for name in SNAPSHOT_COLUMNS}
+    # snapshots written before build_snapshots skipped rows without a symbol
+    known : np.ndarray = columns["symbol_code"] >= 0
+    if not known.all():
+      columns = {name: column[known] for name, column in columns.items()}
+    symbol_id : np.ndarray = tape.symbol_ids[columns["symbol_code"]] if len(columns["symbol_code"]) else np.array([], dtype=np.int64)
+    order : np.ndarray = np.lexsort((symbol_id, columns["day"]))
+    self.day : np.ndarray = columns["day"][order]
+    self.symbol_id : np.ndarray = symbol_id[order]
+    self.bid_px_00 : Dict[str, np.ndarray] = {kind: columns[f"{kind}_bid_px_00"][order] for kind in SNAPSHOTS}
+    self.ask_px_00 : Dict[str, np.ndarray] = {kind: columns[f"{kind}_ask_px_00"][order] for kind in SNAPSHOTS}
+
+  def __len__(self) -> int:
+    return len(self.day)
+
+  def rows(self, day: int, symbol_ids: np.ndarray) -> np.ndarray:
+    """
+    snapshot rows of symbols on a day (days since epoch), -1 where a symbol did not quote
+    """
+    symbol_ids = np.asarray(symbol_ids, dtype=np.int64)
+    lo, hi = np.searchsorted(self.day, [day, day + 1])
+    if lo == hi:
+      return np.full(len(symbol_ids), -1, dtype=np.int64)
+    quoted : np.ndarray = self.symbol_id[lo:hi]
+    at : np.ndarray = np.minimum(np.searchsorted(quoted, symbol_ids), hi - lo - 1)
+    return np.where(quoted[at] == symbol_ids, lo + at, -1)
+
+  def quotes(self, kind: str, day: int, symbol_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (bid, ask) of one snapshot kind for symbols on a day, NaN where there is none
+    """
+    rows : np.ndarray = self.rows(day, symbol_ids)
+    found : np.ndarray = rows >= 0
+    bid : np.ndarray = np.where(found, self.bid_px_00[kind][np.maximum(rows, 0)] if len(self) else np.nan, np.nan)
+    ask : np.ndarray = np.where(found, self.ask_px_00[kind][np.maximum(rows, 0)] if len(self) else np.nan, np.nan)
+    return bid, ask
+
+# merge_events kinds
+CLOSE : int = 0
+QUOTES : int = 1
+ORDER : int = 2
+
+def merge_events(quote_batches, order_ts: np.ndarray, close_ts: np.ndarray) -> Iterator[tuple]:
+  """
+  Merges time-sorted quote batches with sorted order and end-of-day timestamps into a
+  single stream of (CLOSE, close index), (QUOTES, run of quotes) and (ORDER, order index)
+  events. At equal timestamps a close comes first, then quotes, then orders, so an order
+  sees every quote up to and including its own timestamp. Batches are only cut where an
+  order or close falls inside them, which keeps runs of quotes vectorized.
+  """
+  order_ts = np.asarray(order_ts, dtype=np.int64)
+  close_ts = np.asarray(close_ts, dtype=np.int64)
+  never : int = np.iinfo(np.int64).max
+  next_order : int = 0
+  next_close : int = 0
+
+  for batch in quote_batches:
+    ts : np.ndarray = batch["ts_recv"]
+    start : int = 0
+    while start < len(ts):
+      order_at : int = order_ts[next_order] if next_order < len(order_ts) else never
+      close_at : int = close_ts[next_close] if next_close < len(close_ts) else never
+      if close_at <= ts[start] and close_at <= order_at:
+        yield CLOSE, next_close
+        next_close += 1
+      elif order_at < ts[start]:
+        yield ORDER, next_order
+        next_order += 1
+      else:
+        rest : np.ndarray = ts[start:]
+        end : int = start + int(min(np.searchsorted(rest, close_at), np.searchsorted(rest, order_at, side="right")))
+        yield QUOTES, {name: column[start:end] for name, column in batch.items()}
+        start = end
+
+  while next_order < len(order_ts) or next_close < len(close_ts):
+    if next_close < len(close_ts) and (next_order >= len(order_ts) or close_ts[next_close] <= order_ts[next_order]):
+      yield CLOSE, next_close
+      next_close += 1
+    else:
+      yield ORDER, next_order
+      next_order += 1
+
+def readonly(array: np.ndarray) -> np.ndarray:
+  view : np.ndarray = np.asarray(array).view()
+  view.flags.writeable = False
+  return view
+
+class MarketData:
+  """
+  Everything a run reads, loaded once per process and passed to both the strategy and
+  the backtester. The options columns and SPX bars are read-only NumPy views over the
+  memory-mapped column cache, so both sides share one set of buffers.
+
+  options : ts_recv (int64 ns), symbol_code, bid/ask price and size, one row per quote
+  snapshots : open / last / close bid and ask per (symbol, day), see DailySnapshots
+  calendar : the trading sessions, the days with SPX minute bars
+  spx_minute : ts (int64 ns, tape clock), price
+  spx_hourly : ts (int64 ns), open, high, low, close, volume (empty without the file)
+  """
+
+  def __init__(self, options_csv: str = OPTIONS_CSV, underlying_csv: str = UNDERLYING_CSV,
+               hourly_csv: str = HOURLY_CSV, symbols: SymbolTable = SYMBOLS) -> None:
+    self.options_csv : str = options_csv
+    self.tape : QuoteTape = QuoteTape(options_csv, symbols)
+    self.options : Dict[str, np.ndarray] = {name: readonly(getattr(self.tape, name)) for name in QuoteTape.columns}
+    # codes into tape.symbol_ids, mapped to ids a batch at a time by tape.batches()
+    self.options["symbol_code"] = readonly(self.tape.symbol_codes)
+    self.snapshots : DailySnapshots = DailySnapshots(self.tape)
+
+    self.underlying : pd.DataFrame = read_underlying(underlying_csv)
+    self.minute_bars : MinuteBars = MinuteBars(self.underlying)
+    self.calendar : TradingCalendar = TradingCalendar(self.minute_bars.days)
+    days : np.ndarray = pd.to_datetime(self.underlying["date"].astype(str), format="%Y%m%d").to_numpy(dtype="datetime64[D]").view(np.int64)
+    minute_of_day : np.ndarray = self.underlying["ms_of_day"].to_numpy(dtype=np.int64) // 60_000 + 5 * 60 # + 5 to account for UTC->EST
+    self.spx_minute : Dict[str, np.ndarray] = {
+      "ts": readonly((days * 1440 + minute_of_day) * 60_000_000_000),
+      "price": readonly(self.underlying["price"].to_numpy()),
+    }
+
+    self.hourly_columns : Dict = {}
+    self.spx_hourly : Dict[str, np.ndarray] = {"ts": readonly(np.array([], dtype=np.int64))}
+    if os.path.exists(hourly_csv) or os.path.exists(os.path.join(cache_path(hourly_csv), "meta.json")):
+      self.hourly_columns = {name.lower(): column for name, column in load_columns(hourly_csv).items()}
+      dates : pd.Series = pd.Series(np.asarray(self.hourly_columns["date"], dtype=object))
+      self.spx_hourly["ts"] = readonly(to_ns(pd.to_datetime(dates, utc=True, format="ISO8601").dt.tz_localize(None).to_numpy(dtype="datetime64[ns]")))
+      for name in ("open", "high", "low", "close", "volume"):
+        self.spx_hourly[name] = readonly(self.hourly_columns[name])
+
+  def read_options(self, iso_timestamps: bool = False, start_date=None, end_date=None) -> pd.DataFrame:
+    """
+    the options tape as a DataFrame over the shared column cache, see read_options
+    """
+    return read_options(self.options_csv, iso_timestamps=iso_timestamps, start_date=start_date, end_date=end_date)
+
+  def read_hourly(self) -> pd.DataFrame:
+    """
+    the SPX hourly file as pd.read_csv would give it, with lower-cased column names
+    """
+    return pd.DataFrame(self.hourly_columns, copy=False)
@@ -0,0 +1,112 @@
+"""
+Performance metrics over equity curves. Every function takes a curve of shape (..., T),
+time on the last axis, so a single 1-D pnl list and a 2-D stack of curves from a
+parameter sweep go through the same code and come back with shape (...).
+"""
+
+import numpy as np
+from typing import Dict
+
+INITIAL_CAPITAL : float = 100_000_000
+RISK_FREE_RATE : float = 0.03 / 252 # per trading day
+MIN_DRAWDOWN : float = 1e-10 # floor so a curve that never draws down still scores
+
+def returns(equity, initial: float = INITIAL_CAPITAL) -> np.ndarray:
+  """
+  period-over-period ratios (1.01 for +1%), the first one against the initial capital
+  """
+  equity = np.asarray(equity, dtype=np.float64)
+  previous : np.ndarray = np.concatenate([np.full(equity.shape[:-1] + (1,), float(initial)), equity[..., :-1]], axis=-1)
+  return equity / previous
+
+def drawdown(equity) -> np.ndarray:
+  """
+  fractional drawdown from the running peak at every point, same shape as equity
+  """
+  equity = np.asarray(equity, dtype=np.float64)
+  peak : np.ndarray = np.maximum.accumulate(equity, axis=-1)
+  return (peak - equity) / peak
+
+def max_drawdown(equity) -> np.ndarray:
+  return np.maximum(drawdown(equity).max(axis=-1), MIN_DRAWDOWN)
+
+def overall_return(equity, initial: float = INITIAL_CAPITAL) -> np.ndarray:
+  """
+  final equity as a percentage of the initial capital
+  """
+  return 100 * np.asarray(equity, dtype=np.float64)[..., -1] / initial
+
+def sharpe_ratio(equity, initial: float = INITIAL_CAPITAL, risk_free: float = RISK_FREE_RATE) -> np.ndarray:
+  """
+  mean excess return per period over its standard deviation, 0 for a flat or empty curve.
+  The mean is over the same ratios as the standard deviation, one per point of the curve,
+  so no separate period count can disagree with it; the competition's sum(ratios) / 61
+  counted one more ratio than days.
+  """
+  ratios : np.ndarray = returns(equity, initial)
+  if ratios.shape[-1] == 0:
+    return np.zeros(ratios.shape[:-1])
+  excess : np.ndarray = ratios.mean(axis=-1) - 1 - risk_free
+  std : np.ndarray = ratios.std(axis=-1)
+  return np.where(std > 0, excess / np.where(std > 0, std, 1), 0.0)
+
+def sortino_ratio(equity, initial: float = INITIAL_CAPITAL, risk_free: float = RISK_FREE_RATE) -> np.ndarray:
+  """
+  as sharpe_ratio, over the downside deviation below the risk-free rate
+  """
+  ratios : np.ndarray = returns(equity, initial)
+  if ratios.shape[-1] == 0:
+    return np.zeros(ratios.shape[:-1])
+  excess : np.ndarray = ratios.mean(axis=-1) - 1 - risk_free
+  downside : np.ndarray = np.sqrt(np.mean(np.minimum(ratios - 1 - risk_free, 0) ** 2, axis=-1))
+  return np.where(downside > 0, excess / np.where(downside > 0, downside, 1), 0.0)
+
+def calmar_ratio(equity, periods: int, initial: float = INITIAL_CAPITAL) -> np.ndarray:
+  """
+  annualised return over max drawdown, NaN for a curve that ends below zero or spans
+  no trading days. periods is the number of trading days the curve spans: the
+  backtester's curve has one point per session plus the final liquidation, which is
+  made on the last session and adds no day.
+  """
+  growth : np.ndarray = np.asarray(equity, dtype=np.float64)[..., -1] / initial
+  if periods <= 0:
+    return np.full(growth.shape, np.nan)
+  with np.errstate(invalid="ignore"):
+    annual : np.ndarray = growth ** (252 / periods) - 1
+  return annual / max_drawdown(equity)
+
+def turnover(traded, equity) -> np.ndarray:
+  """
+  traded notional over average equity
+  """
+  return np.asarray(traded, dtype=np.float64).sum(axis=-1) / np.asarray(equity, dtype=np.float64).mean(axis=-1)
+
+def hit_rate(equity, initial: float = INITIAL_CAPITAL) -> np.ndarray:
+  """
+  share of periods that gained, out of the periods where equity moved at all
+  """
+  change : np.ndarray = np.diff(np.asarray(equity, dtype=np.float64), axis=-1, prepend=float(initial))
+  moved : np.ndarray = (change != 0).sum(axis=-1)
+  return np.where(moved > 0, (change > 0).sum(axis=-1) / np.maximum(moved, 1), 0.0)
+
+def overall_score(equity, initial: float = INITIAL_CAPITAL) -> np.ndarray:
+  return overall_return(equity, initial) / max_drawdown(equity) * sharpe_ratio(equity, initial)
+
+def summary(equity, periods: int, traded=None, initial: float = INITIAL_CAPITAL) -> Dict[str, np.ndarray]:
+  """
+  every metric for one curve or a stack of curves, keyed by name; periods (trading
+  days) only annualises calmar_ratio
+  """
+  metrics : Dict[str, np.ndarray] = {
+    "pnl": np.asarray(equity, dtype=np.float64)[..., -1],
+    "overall_return": overall_return(equity, initial),
+    "max_drawdown": max_drawdown(equity),
+    "sharpe_ratio": sharpe_ratio(equity, initial),
+    "sortino_ratio": sortino_ratio(equity, initial),
+    "calmar_ratio": calmar_ratio(equity, periods, initial),
+    "hit_rate": hit_rate(equity, initial),
+    "overall_score": overall_score(equity, initial),
+  }
+  if traded is not None:
+    metrics["turnover"] = turnover(traded, equity)
+  return metrics
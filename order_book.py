@@ -0,0 +1,93 @@
+import numpy as np
+from collections import deque
+from typing import Dict, Tuple
+from positions import BUY, SELL
+
+class OrderBook:
+  """
+  Displayed size and resting orders per symbol for partial fills. Every quote
+  replenishes the size displayed at its bid and ask, and fills consume it: buys take
+  from the ask, sells from the bid. Whatever an order could not fill rests in a FIFO
+  queue per (symbol, side) and fills against that symbol's later quotes.
+
+  A run of quotes only walks the rows of symbols with orders resting and every
+  remainder leaves its queue once, so advancing the book is amortized O(1) per quote.
+  """
+
+  def __init__(self, n_symbols: int) -> None:
+    self.bid_available : np.ndarray = np.zeros(n_symbols)
+    self.ask_available : np.ndarray = np.zeros(n_symbols)
+    self.waiting : np.ndarray = np.zeros(n_symbols, dtype=bool) # symbol id -> has resting orders
+    self.queues : Dict[Tuple[int, int], deque] = {} # (symbol id, side) -> [order, remaining size]
+    self.resting : int = 0
+
+  def __len__(self) -> int:
+    return self.resting
+
+  def grow(self, n_symbols: int) -> None:
+    """
+    makes room for symbol ids interned after the run started
+    """
+    extra : int = n_symbols - len(self.waiting)
+    if extra <= 0:
+      return
+    self.bid_available = np.concatenate([self.bid_available, np.zeros(extra)])
+    self.ask_available = np.concatenate([self.ask_available, np.zeros(extra)])
+    self.waiting = np.concatenate([self.waiting, np.zeros(extra, dtype=bool)])
+
+  def refresh(self, symbol_ids: np.ndarray, bid_sz_00: np.ndarray, ask_sz_00: np.ndarray) -> None:
+    """
+    resets the displayed size of symbols to their latest quotes
+    """
+    self.bid_available[symbol_ids] = bid_sz_00
+    self.ask_available[symbol_ids] = ask_sz_00
+
+  def available(self, symbol_id: int, side: int) -> float:
+    return float(self.ask_available[symbol_id] if side == BUY else self.bid_available[symbol_id])
+
+  def consume(self, symbol_id: int, side: int, size: float) -> None:
+    if side == BUY:
+      self.ask_available[symbol_id] -= size
+    else:
+      self.bid_available[symbol_id] -= size
+
+  def display(self, symbol_id: int, side: int, size: float) -> None:
+    if side == BUY:
+      self.ask_available[symbol_id] = size
+    else:
+      self.bid_available[symbol_id] = size
+
+  def rest(self, symbol_id: int, side: int, order, size: float) -> None:
+    self.queues.setdefault((symbol_id, side), deque()).append([order, size])
+    self.waiting[symbol_id] = True
+    self.resting += 1
+
+  def waiting_rows(self, symbol_ids: np.ndarray) -> np.ndarray:
+    """
+    rows of a run of quotes whose symbol has orders resting
+    """
+    if self.resting == 0:
+      return np.array([], dtype=np.int64)
+    return np.flatnonzero(self.waiting[symbol_ids])
+
+  def queue(self, symbol_id: int, side: int) -> deque:
+    return self.queues.get((symbol_id, side)) or deque()
+
+  def pop(self, symbol_id: int, side: int) -> None:
+    queue : deque = self.queues[(symbol_id, side)]
+    queue.popleft()
+    self.resting -= 1
+    if not queue:
+      del self.queues[(symbol_id, side)]
+      self.waiting[symbol_id] = (symbol_id, BUY if side == SELL else SELL) in self.queues
+
+  def cancel_all(self) -> int:
+    """
+    drops every resting order (at the close, as day orders), returns how many there were
+    """
+    cancelled : int = self.resting
+    for symbol_id, _ in self.queues:
+      self.waiting[symbol_id] = False
+    self.queues.clear()
+    self.resting = 0
+    return cancelled
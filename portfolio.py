@@ -0,0 +1,181 @@
+import metrics
+import numpy as np
+import pandas as pd
+from itertools import tee
+from typing import Dict, List
+from backtester import ORDER_COLUMNS, Backtester, prefetch
+from instrumentation import Instruments
+from market_data import CLOSE, ORDER, QUOTES, LatestQuotes, MarketData, merge_events
+from order_book import OrderBook
+from symbols import SYMBOLS
+
+COMBINED : str = "combined"
+
+class LineupOrders:
+  """
+  the strategy of the combined book: every up-front order of the lineup's accounts
+  """
+
+  def __init__(self, accounts: List[Backtester]) -> None:
+    self.accounts : List[Backtester] = accounts
+
+  def generate_orders(self) -> pd.DataFrame:
+    orders : List[pd.DataFrame] = [account.orders[list(ORDER_COLUMNS)] for account in self.accounts if len(account.orders) > 0]
+    return pd.concat(orders, ignore_index=True) if orders else None
+
+class Portfolio:
+  """
+  Backtests a lineup of strategies in a single pass over the market data. Every strategy
+  trades its own account, a Backtester with its own capital, positions, resting orders
+  and equity curve, with the same results as a Backtester of its own. The tape is
+  scanned once and each run of quotes is applied once to quotes all accounts share,
+  then the accounts' orders and clock ticks are dispatched in time order.
+
+  strategies is a list, or a dict of name -> strategy (list entries are named after
+  their module). capital is one amount for every account, a list with one per strategy,
+  or by default each strategy's own capital attribute. Strategies should be built on
+  the same MarketData, which is passed to every account.
+
+  With combined set, one more account trades every order of the lineup against their
+  total capital, so positions net out and margin is shared. It is self.combined and is
+  reported as "combined". Other keyword arguments (partial_fills, mark, intraday,
+  instrument, progress_interval) are passed to every account's Backtester.
+  """
+
+  def __init__(self, start_date, end_date, strategies, capital=None, combined: bool = False, prefetch: int = 0,
+               market_data: MarketData = None, profile_path: str = None, **kwargs) -> None:
+    if "intraday_path" in kwargs:
+      raise ValueError("intraday_path would be shared by every account, use intraday")
+    if not isinstance(strategies, dict):
+      strategies = self.name_strategies(strategies)
+    if len(strategies) == 0:
+      raise ValueError("a portfolio needs at least one strategy")
+    self.names : List[str] = list(strategies)
+    if capital is None:
+      capital = [getattr(strategy, "capital", metrics.INITIAL_CAPITAL) for strategy in strategies.values()]
+    elif np.ndim(capital) == 0:
+      capital = [capital] * len(strategies)
+    if len(capital) != len(strategies):
+      raise ValueError(f"{len(capital)} capital amounts for {len(strategies)} strategies")
+
+    self.instruments : Instruments = Instruments(kwargs.get("instrument", False) or profile_path is not None, profile_path)
+    self.prefetch : int = prefetch
+    if market_data is None:
+      market_data = next((strategy.market_data for strategy in strategies.values() if getattr(strategy, "market_data", None) is not None), None)
+    with self.instruments.timer("load"):
+      self.market_data : MarketData = market_data if market_data is not None else MarketData()
+
+    self.accounts : Dict[str, Backtester] = {
+      name: Backtester(start_date, end_date, strategy, market_data=self.market_data, capital=float(amount), **kwargs)
+      for (name, strategy), amount in zip(strategies.items(), capital)
+    }
+    self.combined : Backtester = None
+    if combined:
+      self.combined = Backtester(start_date, end_date, LineupOrders(list(self.accounts.values())), market_data=self.market_data,
+                                 capital=float(sum(capital)), **kwargs)
+
+  @staticmethod
+  def name_strategies(strategies: List) -> Dict:
+    """
+    example: [starter_code.Strategy(), example_strategy.Strategy()] -> {"starter_code": ..., "example_strategy": ...}
+    """
+    named : Dict = {}
+    for i, strategy in enumerate(strategies):
+      name : str = type(strategy).__module__
+      named[name if name not in named and name != COMBINED else f"{name}[{i}]"] = strategy
+    return named
+
+  def backtesters(self) -> List[Backtester]:
+    """
+    every account, the combined book last
+    """
+    return list(self.accounts.values()) + ([] if self.combined is None else [self.combined])
+
+  def replay(self, quotes: LatestQuotes, batches: List, orders: List[pd.DataFrame], clock_ts: np.ndarray, first_tick: int) -> None:
+    """
+    Backtester.replay for every account at once: orders holds each account's pending
+    orders, and each order is filled by the account it belongs to
+    """
+    accounts : List[Backtester] = self.backtesters()
+    rows : List[List] = [list(pending.itertuples(index=False)) for pending in orders]
+    owner : np.ndarray = np.repeat(np.arange(len(orders)), [len(pending) for pending in orders])
+    position : np.ndarray = np.concatenate([np.arange(len(pending)) for pending in orders])
+    order_ts : np.ndarray = np.concatenate([pending["ts"].to_numpy(dtype=np.int64) for pending in orders])
+    by_time : np.ndarray = np.argsort(order_ts, kind="stable")
+    for kind, payload in merge_events(batches, order_ts[by_time], clock_ts[first_tick:]):
+      if kind == QUOTES:
+        with self.instruments.timer("quotes"):
+          updated : np.ndarray = quotes.update(payload)
+        self.instruments.count("quote_rows", len(payload["ts_recv"]))
+        for account in accounts:
+          account.on_quotes(payload, updated)
+      elif kind == ORDER:
+        i : int = int(by_time[payload])
+        accounts[owner[i]].on_order(rows[owner[i]][position[i]])
+      elif kind == CLOSE:
+        for account in accounts:
+          account.on_tick(first_tick + payload)
+
+  def calculate_pnl(self) -> None:
+    accounts : List[Backtester] = self.backtesters()
+    with self.instruments.profile(), self.instruments.timer("calculate_pnl"):
+      range_start, range_end, clock_ts = [account.start_clock() for account in accounts][0]
+      quotes : LatestQuotes = LatestQuotes(len(SYMBOLS))
+      for account in accounts:
+        account.quotes = quotes
+        account.book = OrderBook(len(SYMBOLS))
+      pending : List[pd.DataFrame] = [account.pending_orders(range_start, range_end) for account in accounts]
+      next_tick : int = 0
+
+      # one scan of the tape, read by every strategy's signals in lockstep
+      strategies : List[Backtester] = list(self.accounts.values())
+      batches = tee(self.market_data.tape.batches(range_start, range_end), len(strategies))
+      stream = zip(*(account.signals(range_start, range_end, account_batches) for account, account_batches in zip(strategies, batches)))
+      if self.prefetch > 0:
+        stream = prefetch(stream, self.prefetch)
+      for steps in stream:
+        batch, cutoff, _ = steps[0]
+        orders : List = [step[2] for step in steps]
+        if self.combined is not None:
+          online : List[pd.DataFrame] = [order for order in orders if order is not None and len(order) > 0]
+          orders.append(pd.concat(online, ignore_index=True) if online else None)
+        pending = [Backtester.queue_orders(waiting, new, range_start, range_end) for waiting, new in zip(pending, orders)]
+        # everything strictly before the batch's last quote is final once the batch is applied
+        n_orders : List[int] = [int(np.searchsorted(waiting["ts"].to_numpy(), cutoff)) for waiting in pending]
+        n_ticks : int = int(np.searchsorted(clock_ts, cutoff, side="right"))
+        self.replay(quotes, [] if batch is None else [batch], [waiting.iloc[:n] for waiting, n in zip(pending, n_orders)],
+                    clock_ts[:n_ticks], next_tick)
+        pending = [waiting.iloc[n:] for waiting, n in zip(pending, n_orders)]
+        next_tick = max(next_tick, n_ticks)
+      self.replay(quotes, [], pending, clock_ts, next_tick)
+      for account in accounts:
+        account.finish()
+    if self.instruments.enabled:
+      print(self.instruments.summary())
+      for name, account in zip(self.names + [COMBINED], accounts):
+        print(name)
+        print(account.instruments.summary())
+
+  def results(self, trading_days: int = None) -> pd.DataFrame:
+    """
+    one row of capital and metrics per account, the combined book last
+    """
+    accounts : List[Backtester] = self.backtesters()
+    if trading_days is None:
+      trading_days = accounts[0].trading_days()
+    rows : List[Dict] = []
+    for name, account in zip(self.names + [COMBINED], accounts):
+      scores : Dict[str, np.ndarray] = metrics.summary(account.pnl, trading_days, traded=account.traded, initial=account.initial_capital)
+      rows.append({"strategy": name, "capital": account.initial_capital, **{metric: float(value) for metric, value in scores.items()}})
+    return pd.DataFrame(rows)
+
+if __name__ == "__main__":
+  from datetime import datetime
+  import example_strategy
+  import starter_code
+  market_data = MarketData()
+  portfolio = Portfolio(datetime(2024, 1, 1), datetime(2024, 3, 30),
+                        [starter_code.Strategy(market_data=market_data), example_strategy.Strategy(market_data=market_data)],
+                        combined=True, market_data=market_data)
+  portfolio.calculate_pnl()
+  print(portfolio.results().to_string(index=False))
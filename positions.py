@@ -0,0 +1,188 @@
+import numpy as np
+from typing import Dict, List, Set
+
+BUY : int = 1
+SELL : int = -1
+
+class PositionBook:
+  """
+  Open option positions stored as struct-of-arrays columns, one slot per symbol.
+  Netting, increasing and closing a position are O(1) through the symbol -> slot
+  dict, closed slots are recycled, and positions are bucketed by expiration day
+  so settlement only touches what expires.
+  """
+
+  # column name -> (dtype, fill value for empty slots)
+  columns : Dict[str, tuple] = {
+    "symbols": (object, None),
+    "symbol_id": (np.int64, -1), # SYMBOLS id
+    "active": (bool, False),
+    "side": (np.int8, 0),
+    "order_size": (np.float64, 0.0),
+    "is_call": (bool, False),
+    "strike": (np.float64, 0.0),
+    "expiration_date": (np.int64, 0), # days since epoch
+    "hour": (np.int64, 0),
+    "minute": (np.int64, 0),
+    "bid_px_00": (np.float64, 0.0),
+    "ask_px_00": (np.float64, 0.0),
+    "running_bid_px_00": (np.float64, 0.0),
+    "running_ask_px_00": (np.float64, 0.0),
+    "unrealized": (np.float64, 0.0), # see revalue
+  }
+
+  def __init__(self, capacity: int = 1024) -> None:
+    self.slots : Dict[str, int] = {}
+    self.by_expiry : Dict[int, Set[int]] = {}
+    self.free : List[int] = []
+    self.capacity : int = 0
+    self.symbol_slots : np.ndarray = np.full(0, -1, dtype=np.int64) # symbol id -> slot
+    self.unrealized_total : float = 0.0
+    self.allocate(capacity)
+
+  def allocate(self, capacity: int) -> None:
+    for name, (dtype, fill) in self.columns.items():
+      column : np.ndarray = np.full(capacity, fill, dtype=dtype)
+      if self.capacity:
+        column[:self.capacity] = getattr(self, name)
+      setattr(self, name, column)
+    self.free.extend(range(capacity - 1, self.capacity - 1, -1))
+    self.capacity = capacity
+
+  def __len__(self) -> int:
+    return len(self.slots)
+
+  def __contains__(self, symbol: str) -> bool:
+    return symbol in self.slots
+
+  def open(self, symbol: str, symbol_id: int, side: int, order_size: float, is_call: bool, strike: float,
+           expiration_date: int, hour: int, minute: int, bid_px_00: float, ask_px_00: float) -> int:
+    if not self.free:
+      self.allocate(2 * self.capacity)
+    slot : int = self.free.pop()
+    self.slots[symbol] = slot
+    self.by_expiry.setdefault(expiration_date, set()).add(slot)
+    if symbol_id >= len(self.symbol_slots):
+      self.symbol_slots = np.concatenate([self.symbol_slots, np.full(max(symbol_id + 1, 2 * len(self.symbol_slots)) - len(self.symbol_slots), -1, dtype=np.int64)])
+    self.symbol_slots[symbol_id] = slot
+
+    self.symbols[slot] = symbol
+    self.symbol_id[slot] = symbol_id
+    self.active[slot] = True
+    self.side[slot] = side
+    self.order_size[slot] = order_size
+    self.is_call[slot] = is_call
+    self.strike[slot] = strike
+    self.expiration_date[slot] = expiration_date
+    self.hour[slot] = hour
+    self.minute[slot] = minute
+    self.bid_px_00[slot] = self.running_bid_px_00[slot] = bid_px_00
+    self.ask_px_00[slot] = self.running_ask_px_00[slot] = ask_px_00
+    return slot
+
+  def close(self, symbol: str) -> None:
+    slot : int = self.slots.pop(symbol)
+    self.by_expiry[int(self.expiration_date[slot])].discard(slot)
+    self.symbol_slots[self.symbol_id[slot]] = -1
+    self.unrealized_total -= self.unrealized[slot]
+    self.unrealized[slot] = 0.0
+    self.symbols[slot] = None
+    self.symbol_id[slot] = -1
+    self.active[slot] = False
+    self.free.append(slot)
+
+  def net(self, symbol: str, side: int, order_size: float) -> bool:
+    """
+    applies a fill to an existing position, returns False if the symbol has none
+    """
+    slot = self.slots.get(symbol)
+    if slot is None:
+      return False
+    assert order_size
+    if side == self.side[slot]:
+      self.order_size[slot] += order_size
+    elif order_size > self.order_size[slot]:
+      self.side[slot] = side
+      self.order_size[slot] = order_size - self.order_size[slot]
+    elif order_size == self.order_size[slot]:
+      self.close(symbol)
+    else:
+      self.order_size[slot] -= order_size
+    return True
+
+  def slots_of(self, symbol_ids: np.ndarray) -> np.ndarray:
+    """
+    open slots for symbol ids, -1 where the symbol has no position
+    """
+    symbol_ids = np.asarray(symbol_ids, dtype=np.int64)
+    inside : np.ndarray = (symbol_ids >= 0) & (symbol_ids < len(self.symbol_slots))
+    return np.where(inside, self.symbol_slots[np.where(inside, symbol_ids, 0)] if len(self.symbol_slots) else -1, -1)
+
+  def open_slots(self) -> np.ndarray:
+    return np.flatnonzero(self.active)
+
+  def expiry_days(self, expiration_date: int, after: int = None) -> List[int]:
+    """
+    expiration days with positions in (after, expiration_date], just expiration_date
+    without after. A session close passes the previous close as after, so expiries
+    that fall between two sessions are picked up at the next one.
+    """
+    if after is None:
+      return [expiration_date] if expiration_date in self.by_expiry else []
+    return [day for day in self.by_expiry if after < day <= expiration_date]
+
+  def expiring(self, expiration_date: int, after: int = None) -> np.ndarray:
+    days : List[int] = self.expiry_days(expiration_date, after)
+    return np.sort(np.fromiter((slot for day in days for slot in self.by_expiry[day]), dtype=np.int64))
+
+  def remove_expiring(self, expiration_date: int, after: int = None) -> None:
+    for slot in self.expiring(expiration_date, after):
+      self.close(self.symbols[slot])
+    for day in self.expiry_days(expiration_date, after):
+      del self.by_expiry[day]
+
+  def settle(self, slots: np.ndarray, underlying_price: np.ndarray) -> tuple:
+    """
+    intrinsic-value settlement of the given slots at their underlying prices,
+    returns the (capital, portfolio value) change
+    """
+    size : np.ndarray = self.order_size[slots]
+    strike : np.ndarray = self.strike[slots]
+    is_call : np.ndarray = self.is_call[slots]
+    stock_value : np.ndarray = 100 * size * underlying_price
+    cost_to_buy : np.ndarray = 100 * size * strike
+    in_the_money : np.ndarray = np.where(is_call, underlying_price > strike, underlying_price < strike)
+    payoff : np.ndarray = np.where(in_the_money, np.where(is_call, stock_value - cost_to_buy, cost_to_buy - stock_value), 0.0)
+
+    bought : np.ndarray = self.side[slots] == BUY
+    sold : np.ndarray = self.side[slots] == SELL
+    capital : float = np.sum(payoff[bought]) - np.sum(payoff[sold])
+    # a long position that finishes in the money stops being carried at its last mark
+    portfolio : float = -np.sum((size * 100 * self.running_ask_px_00[slots])[bought & in_the_money])
+    return float(capital), float(portfolio)
+
+  def mark(self, slots: np.ndarray, bid_px_00: np.ndarray, ask_px_00: np.ndarray) -> tuple:
+    """
+    marks longs to the bid and shorts to the ask, rolls the running prices forward
+    and returns the (capital, portfolio value) change
+    """
+    size : np.ndarray = self.order_size[slots]
+    bought : np.ndarray = self.side[slots] == BUY
+    sold : np.ndarray = self.side[slots] == SELL
+    portfolio : float = np.sum(((bid_px_00 - self.running_ask_px_00[slots]) * 100 * size)[bought])
+    capital : float = np.sum(((self.running_bid_px_00[slots] - ask_px_00) * 100 * size)[sold])
+    self.running_ask_px_00[slots[bought]] = bid_px_00[bought]
+    self.running_bid_px_00[slots[sold]] = ask_px_00[sold]
+    return float(capital), float(portfolio)
+
+  def revalue(self, slots: np.ndarray, bid_px_00: np.ndarray, ask_px_00: np.ndarray) -> None:
+    """
+    unrealized pnl of the given (distinct) slots against new quotes, as mark would book
+    it, without rolling the running prices. unrealized_total is kept up to date so only
+    the slots whose quotes changed need revaluing.
+    """
+    size : np.ndarray = self.order_size[slots]
+    value : np.ndarray = np.where(self.side[slots] == BUY, (bid_px_00 - self.running_ask_px_00[slots]) * 100 * size,
+                                  (self.running_bid_px_00[slots] - ask_px_00) * 100 * size)
+    self.unrealized_total += float(np.sum(value - self.unrealized[slots]))
+    self.unrealized[slots] = value
@@ -1,40 +1,257 @@
+import math
 import numpy as np
-from scipy.stats import norm
+from collections import OrderedDict
+from typing import NamedTuple
+# ndtr is the erf-based standard normal CDF as a bare ufunc, without norm.cdf's per-call argument handling
+from scipy.special import ndtr
+
+SQRT_2PI = np.sqrt(2 * np.pi)
+
+class Greeks(NamedTuple):
+    price: np.ndarray
+    delta: np.ndarray
+    gamma: np.ndarray
+    vega: np.ndarray
+    theta: np.ndarray
+
+def norm_pdf(x):
+    return np.exp(-0.5 * x * x) / SQRT_2PI
 
 def black_scholes_call(S, K, T, r=0.01, sigma=0.15):
     d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
     d2 = d1 - sigma * np.sqrt(T)
-    call_price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
+    call_price = S * ndtr(d1) - K * np.exp(-r * T) * ndtr(d2)
     return call_price
 
 def black_scholes_put(S, K, T, r=0.01, sigma=0.15):
     d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
     d2 = d1 - sigma * np.sqrt(T)
-    put_price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
+    put_price = K * np.exp(-r * T) * ndtr(-d2) - S * ndtr(-d1)
     return put_price
 
+def black_scholes(S, K, T, r=0.01, sigma=0.15, is_call=True) -> Greeks:
+    """
+    Price, delta, gamma, vega and theta (per year) for whole arrays of options in one pass.
+    S, K, T, r, sigma and is_call broadcast against each other, so a mixed call/put chain
+    can be valued with a single call: black_scholes(spot, strikes, expiries, 0.01, vols, is_call)
+    """
+    S, K, T, r, sigma = (np.asarray(x, dtype=np.float64) for x in (S, K, T, r, sigma))
+    is_call = np.asarray(is_call, dtype=bool)
+
+    sqrt_T = np.sqrt(T)
+    sigma_sqrt_T = sigma * sqrt_T
+    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / sigma_sqrt_T
+    d2 = d1 - sigma_sqrt_T
+    discounted_K = K * np.exp(-r * T)
+    pdf_d1 = norm_pdf(d1)
+
+    # N(-x) rather than 1 - N(x) keeps deep in-the-money puts accurate
+    n_d1 = np.where(is_call, ndtr(d1), -ndtr(-d1))
+    n_d2 = np.where(is_call, ndtr(d2), -ndtr(-d2))
+
+    price = S * n_d1 - discounted_K * n_d2
+    delta = n_d1
+    gamma = pdf_d1 / (S * sigma_sqrt_T)
+    vega = S * pdf_d1 * sqrt_T
+    theta = -S * pdf_d1 * sigma / (2 * sqrt_T) - r * discounted_K * n_d2
+    return Greeks(price, delta, gamma, vega, theta)
+
+def black_scholes_delta(S, K, T, r=0.01, sigma=0.15, is_call=True) -> float:
+    """
+    Delta of a single option from plain floats, for per-fill callers where the array
+    setup of black_scholes costs more than the math. NaN unless S, K and T are
+    positive, as black_scholes gives.
+    """
+    if not (S > 0 and K > 0 and T > 0):
+        return math.nan
+    d1 = (math.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * math.sqrt(T))
+    # N(d1) for calls, -N(-d1) for puts, as in black_scholes
+    return 0.5 * math.erfc(-d1 / math.sqrt(2)) if is_call else -0.5 * math.erfc(d1 / math.sqrt(2))
+
+# ImpliedVolatility.status codes
+IV_CONVERGED = 0
+IV_MAX_ITERATIONS = 1
+IV_OUT_OF_BOUNDS = 2 # price outside the no-arbitrage bounds, or S/K/T not positive
+IV_AT_BOUND = 3 # the price needs a sigma outside sigma_bounds, sigma is the bound it is pinned at
+
+class ImpliedVolatility(NamedTuple):
+    sigma: np.ndarray
+    status: np.ndarray
+    iterations: np.ndarray
+
+def implied_volatilities(option_price, S, K, T, r=0.01, is_call=True, tol=1e-8, max_iterations=100,
+                         sigma_bounds=(1e-4, 5.0)) -> ImpliedVolatility:
+    """
+    Implied volatility for whole arrays of quotes at once. Each element runs Newton steps
+    inside a [low, high] bracket that every iteration tightens; a step that would leave the
+    bracket (or a vanishing vega) falls back to bisection, so deep OTM and near-expiry
+    contracts cannot diverge. Only unconverged elements are repriced on each iteration.
+
+    tol is on sigma: an element converges once its price miss is under tol * vega, the
+    size of the Newton step still left to take, so low-vega quotes are not called converged
+    on a price match that leaves sigma loose. A bracket that collapses without getting
+    there stops as IV_MAX_ITERATIONS.
+    """
+    option_price, S, K, T, r, is_call = np.broadcast_arrays(
+        *(np.asarray(x, dtype=np.float64) for x in (option_price, S, K, T, r)), np.asarray(is_call, dtype=bool))
+    shape = option_price.shape
+    option_price, S, K, T, r, is_call = (x.ravel() for x in (option_price, S, K, T, r, is_call))
+    low_bound, high_bound = sigma_bounds
+
+    with np.errstate(all="ignore"):
+        discounted_K = K * np.exp(-r * T)
+        lower = np.where(is_call, np.maximum(S - discounted_K, 0), np.maximum(discounted_K - S, 0))
+        upper = np.where(is_call, S, discounted_K)
+        valid = (S > 0) & (K > 0) & (T > 0) & (option_price > lower) & (option_price < upper)
+
+        # Corrado-Miller rational approximation as the starting point, puts go through put-call parity
+        call_price = np.where(is_call, option_price, option_price + S - discounted_K)
+        excess = call_price - (S - discounted_K) / 2
+        root = np.sqrt(np.maximum(excess ** 2 - (S - discounted_K) ** 2 / np.pi, 0))
+        sigma = np.sqrt(2 * np.pi / T) / (S + discounted_K) * (excess + root)
+    sigma = np.where(np.isfinite(sigma) & (sigma > low_bound) & (sigma < high_bound), sigma, 0.2)
+    sigma[~valid] = np.nan
+
+    low = np.full(len(sigma), low_bound)
+    high = np.full(len(sigma), high_bound)
+    status = np.where(valid, IV_MAX_ITERATIONS, IV_OUT_OF_BOUNDS)
+    iterations = np.zeros(len(sigma), dtype=np.int64)
+    active = np.flatnonzero(valid)
+
+    # the price is increasing in sigma, so a root outside sigma_bounds shows at the bounds themselves
+    for bound, beyond in ((low_bound, np.less_equal), (high_bound, np.greater_equal)):
+        bound_price = black_scholes(S[active], K[active], T[active], r[active], bound, is_call[active]).price
+        pinned = beyond(option_price[active], bound_price)
+        sigma[active[pinned]] = bound
+        status[active[pinned]] = IV_AT_BOUND
+        active = active[~pinned]
+
+    for _ in range(max_iterations):
+        if len(active) == 0:
+            break
+        current = sigma[active]
+        greeks = black_scholes(S[active], K[active], T[active], r[active], current, is_call[active])
+        price_diff = greeks.price - option_price[active]
+        iterations[active] += 1
+
+        # the sign of the miss says which side of the root we are on
+        too_high = price_diff > 0
+        high[active] = np.where(too_high, current, high[active])
+        low[active] = np.where(too_high, low[active], current)
+        bracket_low, bracket_high = low[active], high[active]
+
+        converged = np.abs(price_diff) < tol * greeks.vega
+        status[active[converged]] = IV_CONVERGED
+        done = converged | (bracket_high - bracket_low < 1e-12)
+
+        with np.errstate(all="ignore"):
+            newton = current - price_diff / greeks.vega
+        inside = np.isfinite(newton) & (newton > bracket_low) & (newton < bracket_high)
+        sigma[active] = np.where(done, current, np.where(inside, newton, 0.5 * (bracket_low + bracket_high)))
+        active = active[~done]
+
+    return ImpliedVolatility(sigma.reshape(shape), status.reshape(shape), iterations.reshape(shape))
+
 def implied_volatility(option_price, S, K, T, r=0.01, option_type="call", tol=1e-8, max_iterations=100):
-    # Initial guess for volatility
-    sigma = 0.2
-    for i in range(max_iterations):
-        if option_type == "call":
-            price = black_scholes_call(S, K, T, r, sigma)
-        else:
-            price = black_scholes_put(S, K, T, r, sigma)
-
-        # Vega: sensitivity of the option price to changes in volatility
-        d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
-        vega = S * norm.pdf(d1) * np.sqrt(T)  # Vega is the partial derivative of option price w.r.t. sigma
-
-        # Price difference
-        price_diff = price - option_price
-
-        # Check if the difference is small enough
-        if abs(price_diff) < tol:
-            return sigma
-
-        # Update volatility estimate using Newton-Raphson
-        sigma = sigma - price_diff / vega
-
-    # If no convergence, return the last value of sigma
-    return sigma
+    # NaN when the price is outside the no-arbitrage bounds, the bound when pinned at one,
+    # the last iterate if it did not converge
+    result = implied_volatilities(option_price, S, K, T, r, option_type == "call", tol, max_iterations)
+    return float(result.sigma)
+
+class VolatilitySurface:
+    """
+    Strike x expiry implied-volatility grid for one time bucket, built from mid quotes.
+    Points are added incrementally (a newer quote for the same strike/expiry replaces the
+    older one) and the grid is only rebuilt on the next query after a change. Queries
+    interpolate linearly in strike within each expiry, then linearly in expiry, with flat
+    extrapolation outside the quoted range.
+    """
+
+    def __init__(self):
+        self.points = {} # (strike, years to expiry) -> implied volatility
+        self.strikes = np.array([])
+        self.expiries = np.array([])
+        self.grid = np.empty((0, 0))
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.points)
+
+    def add(self, K, T, sigma):
+        for strike, expiry, vol in zip(np.ravel(K), np.ravel(T), np.ravel(sigma)):
+            if np.isfinite(vol):
+                self.points[(float(strike), round(float(expiry), 9))] = float(vol)
+                self.dirty = True
+
+    def build(self):
+        keys = np.array(list(self.points.keys()), dtype=np.float64).reshape(-1, 2)
+        vols = np.fromiter(self.points.values(), dtype=np.float64, count=len(self.points))
+        self.strikes, strike_index = np.unique(keys[:, 0], return_inverse=True)
+        self.expiries, expiry_index = np.unique(keys[:, 1], return_inverse=True)
+        self.grid = np.full((len(self.expiries), len(self.strikes)), np.nan)
+        self.grid[expiry_index, strike_index] = vols
+        # fill the strikes an expiry has no quote for from its neighbours
+        for row in self.grid:
+            known = np.isfinite(row)
+            row[~known] = np.interp(self.strikes[~known], self.strikes[known], row[known])
+        self.dirty = False
+
+    def __call__(self, K, T):
+        if not self.points:
+            raise ValueError("empty volatility surface")
+        if self.dirty:
+            self.build()
+        K, T = np.broadcast_arrays(np.asarray(K, dtype=np.float64), np.asarray(T, dtype=np.float64))
+        by_expiry = np.array([np.interp(K.ravel(), self.strikes, row) for row in self.grid])
+        if len(self.expiries) == 1:
+            return by_expiry[0].reshape(K.shape)
+        upper = np.clip(np.searchsorted(self.expiries, T.ravel()), 1, len(self.expiries) - 1)
+        weight = np.clip((T.ravel() - self.expiries[upper - 1]) / (self.expiries[upper] - self.expiries[upper - 1]), 0, 1)
+        columns = np.arange(K.size)
+        sigma = (1 - weight) * by_expiry[upper - 1, columns] + weight * by_expiry[upper, columns]
+        return sigma.reshape(K.shape)
+
+class VolatilitySurfaceCache:
+    """
+    One VolatilitySurface per time bucket (e.g. the int hourly bucket helper.hour_bucket returns),
+    least recently used buckets are evicted past maxsize. Quotes are solved for implied
+    volatility in batches as they arrive, so fair-value queries are interpolations
+    rather than solver runs.
+    """
+
+    def __init__(self, maxsize=32, r=0.01):
+        self.maxsize = maxsize
+        self.r = r
+        self.surfaces = OrderedDict()
+
+    def __contains__(self, bucket):
+        return bucket in self.surfaces
+
+    def get(self, bucket):
+        surface = self.surfaces.get(bucket)
+        if surface is not None:
+            self.surfaces.move_to_end(bucket)
+        return surface
+
+    def update(self, bucket, S, K, T, bid, ask, is_call=True):
+        mid = (np.asarray(bid, dtype=np.float64) + np.asarray(ask, dtype=np.float64)) / 2
+        result = implied_volatilities(mid, S, K, T, self.r, is_call)
+        converged = result.status == IV_CONVERGED
+
+        surface = self.get(bucket)
+        if surface is None:
+            surface = self.surfaces[bucket] = VolatilitySurface()
+            while len(self.surfaces) > self.maxsize:
+                self.surfaces.popitem(last=False)
+        K, T = np.broadcast_arrays(np.asarray(K, dtype=np.float64), np.asarray(T, dtype=np.float64))
+        surface.add(K[converged], T[converged], result.sigma[converged])
+        return surface
+
+    def sigma(self, bucket, K, T, default=0.15):
+        surface = self.get(bucket)
+        if surface is None or len(surface) == 0:
+            return np.full(np.broadcast(np.asarray(K), np.asarray(T)).shape, default)
+        return surface(K, T)
+
+    def fair_value(self, bucket, S, K, T, is_call=True, default=0.15):
+        return black_scholes(S, K, T, self.r, self.sigma(bucket, K, T, default), is_call).price
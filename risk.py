@@ -0,0 +1,149 @@
+import math
+import numpy as np
+from typing import Dict
+from market_data import NS_PER_DAY
+from positions import BUY, PositionBook
+from pricing import black_scholes_delta
+from symbols import SYMBOLS
+
+MARGIN_RATE : float = 0.1 # of the strike for calls, of SPX for puts, on top of the premium
+SETTLEMENT_NS : int = 21 * 60 * 60 * 10**9 # 16:00 EST expiry on the tape clock
+
+class RiskEngine:
+  """
+  Running exposure of a PositionBook: premium notional, margin used, net delta and
+  signed notional per expiration day. Each position's contribution is kept per slot,
+  so a fill, mark or settlement only swaps the contributions of the slots it touched
+  and every aggregate is O(1) to update and to read.
+
+  Notional is 100 * size at the position's running price (the ask a long was bought or
+  last marked at, the bid for a short), margin adds MARGIN_RATE of the strike (calls)
+  or of SPX at the fill (puts), and delta is Black-Scholes at the last fill.
+  """
+
+  def __init__(self, book: PositionBook) -> None:
+    self.book : PositionBook = book
+    self.notional : float = 0.0
+    self.margin_used : float = 0.0
+    self.net_delta : float = 0.0
+    self.exposure : Dict[int, float] = {} # expiration day -> signed notional
+    self.slot_notional : np.ndarray = np.zeros(0)
+    self.slot_margin : np.ndarray = np.zeros(0)
+    self.slot_delta : np.ndarray = np.zeros(0) # signed, per SPX point
+    self.slot_exposure : np.ndarray = np.zeros(0) # signed notional
+    self.slot_expiry : np.ndarray = np.zeros(0, dtype=np.int64)
+    self.slot_add_on : np.ndarray = np.zeros(0)
+    self.slot_unit_delta : np.ndarray = np.zeros(0)
+
+  def can_fill(self, order, order_size: float, bid_px_00: float, ask_px_00: float, underlying_price: float,
+               capital: float) -> bool:
+    """
+    whether capital covers the margin of filling order_size of order at these quotes.
+    Buys pay the premium at the ask plus margin, waived when the symbol is already
+    held; sells need the premium at the bid plus margin.
+    """
+    is_call : bool = bool(SYMBOLS.is_call[order.symbol_id])
+    strike : float = float(SYMBOLS.strike[order.symbol_id])
+    add_on : float = MARGIN_RATE * (strike if is_call else underlying_price)
+    if order.action == "B":
+      options_cost : float = order_size * 100 * ask_px_00
+      margin : float = 0 if order.option_symbol in self.book else options_cost + add_on
+      return capital >= margin and capital - options_cost + 0.5 > 0
+    return capital >= order_size * 100 * bid_px_00 + add_on
+
+  def grow(self) -> None:
+    capacity : int = self.book.capacity
+    for name in ("slot_notional", "slot_margin", "slot_delta", "slot_exposure", "slot_expiry", "slot_add_on", "slot_unit_delta"):
+      column : np.ndarray = getattr(self, name)
+      setattr(self, name, np.concatenate([column, np.zeros(capacity - len(column), dtype=column.dtype)]))
+
+  def track(self, symbol: str, previous_slot, underlying_price: float, ts: int) -> None:
+    """
+    after a fill in symbol: drops the contribution of the slot it held before the fill
+    (None if it had none) and adds the position it holds now, with its margin add-on and
+    delta priced at underlying_price and ts (int64 ns)
+    """
+    if self.book.capacity > len(self.slot_notional):
+      self.grow()
+    if previous_slot is not None:
+      self.release(previous_slot)
+    slot = self.book.slots.get(symbol)
+    if slot is None:
+      return
+    # one slot per fill, in scalars: refresh's array setup would cost more than the math
+    book : PositionBook = self.book
+    strike : float = float(book.strike[slot])
+    is_call : bool = bool(book.is_call[slot])
+    expiry : int = int(book.expiration_date[slot])
+    years : float = max((expiry * NS_PER_DAY + SETTLEMENT_NS - ts) / (365 * NS_PER_DAY), 1e-6)
+    long : bool = book.side[slot] == BUY
+    size : float = float(book.order_size[slot])
+    notional : float = 100 * size * float(book.running_ask_px_00[slot] if long else book.running_bid_px_00[slot])
+    add_on : float = MARGIN_RATE * (strike if is_call else underlying_price)
+    unit_delta : float = black_scholes_delta(underlying_price, strike, years, is_call=is_call)
+    if math.isnan(unit_delta):
+      # unpriceable (SPX or strike at 0): counts as no delta rather than poisoning net_delta
+      unit_delta = 0.0
+    delta : float = (1 if long else -1) * 100 * size * unit_delta
+    exposure : float = notional if long else -notional
+
+    self.notional += notional
+    self.margin_used += notional + add_on
+    self.net_delta += delta
+    self.add_exposure(expiry, exposure)
+    self.slot_notional[slot] = notional
+    self.slot_margin[slot] = notional + add_on
+    self.slot_delta[slot] = delta
+    self.slot_exposure[slot] = exposure
+    self.slot_expiry[slot] = expiry
+    self.slot_add_on[slot] = add_on
+    self.slot_unit_delta[slot] = unit_delta
+
+  def release(self, slot: int) -> None:
+    """
+    removes a slot's contribution, before the book frees it
+    """
+    self.notional -= float(self.slot_notional[slot])
+    self.margin_used -= float(self.slot_margin[slot])
+    self.net_delta -= float(self.slot_delta[slot])
+    self.add_exposure(int(self.slot_expiry[slot]), -float(self.slot_exposure[slot]))
+    self.slot_notional[slot] = self.slot_margin[slot] = self.slot_delta[slot] = self.slot_exposure[slot] = 0.0
+
+  def release_many(self, slots: np.ndarray) -> None:
+    for slot in slots.tolist():
+      self.release(slot)
+
+  def refresh(self, slots: np.ndarray) -> None:
+    """
+    recomputes the contributions of open slots from the book, after a fill or a mark
+    """
+    if len(slots) == 0:
+      return
+    book : PositionBook = self.book
+    long : np.ndarray = book.side[slots] == BUY
+    size : np.ndarray = book.order_size[slots]
+    notional : np.ndarray = 100 * size * np.where(long, book.running_ask_px_00[slots], book.running_bid_px_00[slots])
+    margin : np.ndarray = notional + self.slot_add_on[slots]
+    sign : np.ndarray = np.where(long, 1, -1)
+    delta : np.ndarray = sign * 100 * size * self.slot_unit_delta[slots]
+    exposure : np.ndarray = sign * notional
+
+    # an open slot keeps its expiry, only its signed notional moves
+    expiries : np.ndarray = book.expiration_date[slots]
+    for expiry, amount in zip(expiries.tolist(), (exposure - self.slot_exposure[slots]).tolist()):
+      self.add_exposure(expiry, amount)
+    self.slot_expiry[slots] = expiries
+    self.slot_exposure[slots] = exposure
+    self.notional += float(np.sum(notional - self.slot_notional[slots]))
+    self.margin_used += float(np.sum(margin - self.slot_margin[slots]))
+    self.net_delta += float(np.sum(delta - self.slot_delta[slots]))
+    self.slot_notional[slots] = notional
+    self.slot_margin[slots] = margin
+    self.slot_delta[slots] = delta
+
+  def add_exposure(self, expiry: int, amount: float) -> None:
+    total : float = self.exposure.get(expiry, 0.0) + amount
+    if abs(total) < 1e-6:
+      self.exposure.pop(expiry, None)
+    else:
+      self.exposure[expiry] = total
@@ -1,18 +1,21 @@
 import pandas as pd
+from market_data import MarketData
+from symbols import parse_symbol
 from datetime import datetime
 from collections import defaultdict, deque
 
 class Strategy:
   
-  def __init__(self) -> None:
+  def __init__(self, market_data: MarketData = None, window: int = 5, band: float = 1, max_orders: int = 5000) -> None:
     self.capital : float = 100_000_000
     self.portfolio_value : float = 0
 
     self.start_date : datetime = datetime(2024, 1, 1)
     self.end_date : datetime = datetime(2024, 3, 30)
   
-    self.options : pd.DataFrame = pd.read_csv("data/cleaned_options_data.csv")
-    self.options["day"] = self.options["ts_recv"].apply(lambda x: x.split("T")[0])
+    # shared with the backtester, see Backtester
+    self.market_data : MarketData = market_data if market_data is not None else MarketData()
+    self.options : pd.DataFrame = self.market_data.read_options(iso_timestamps=True, start_date=self.start_date, end_date=self.end_date)
 
     self.options["bid_px_00"] = self.options["bid_px_00"].astype(float)
     self.options["ask_px_00"] = self.options["ask_px_00"].astype(float)
@@ -23,10 +26,13 @@ class Strategy:
     # appends a fair_value column to the pandas dataframe
     self.options = self.calculate_fair_value( self.options )
     self.moving_averages = defaultdict(deque)
+    # tunables, see sweep.py
+    self.window : int = window
+    self.band : float = band
+    self.max_orders : int = max_orders
     self.positions = defaultdict(int)
 
-    self.underlying = pd.read_csv("data/underlying_data_hour.csv")
-    self.underlying.columns = self.underlying.columns.str.lower()
+    self.underlying = self.market_data.read_hourly()
   
 
   # helper function
@@ -50,24 +56,12 @@ class Strategy:
   # helper function
   # given a symbol, will parse and return a dictionary with more friendly formatting of data
   def parse_symbol(self, symbol : str ) -> dict:
-    _ , data = symbol.split(" ")
-    parsed_symbol = {}
-
-    # check for the type
-    if "C" in data:
-      parsed_symbol["option_type"] = "C"
-    else:
-      parsed_symbol["option_type"] = "P" 
-    
-    # read in the date
-    expiration_date = data[:8]
-    parsed_symbol["expiration_date"] = expiration_date 
-    
-    # read in the strike price
-    strike_price = data[9:]
-    parsed_symbol["strike_price"] = strike_price
-
-    return parsed_symbol
+    expiration_date, option_type, strike_price = parse_symbol(symbol)
+    return {
+      "option_type": option_type,
+      "expiration_date": expiration_date,
+      "strike_price": strike_price
+    }
 
 
   def generate_orders(self) -> pd.DataFrame:
@@ -85,10 +79,10 @@ class Strategy:
       # if fair_value below the moving average, buy
       self.moving_averages[ row.symbol ].append( row.fair_value )
       curr_moving_average = sum(self.moving_averages[ row.symbol ]) / len(self.moving_averages[ row.symbol ])
-      if len(self.moving_averages[row.symbol]) > 5:
+      if len(self.moving_averages[row.symbol]) > self.window:
         self.moving_averages[row.symbol].popleft()
 
-      if curr_moving_average > row.fair_value+1:
+      if curr_moving_average > row.fair_value+self.band:
         buy_order = { "datetime": row.ts_recv, 
                      "option_symbol": row.symbol, 
                      "action": "B", 
@@ -98,7 +92,7 @@ class Strategy:
         my_orders = pd.concat( [ my_orders, buy_order], ignore_index=True )
         order_count += 1
         # self.positions += (int(row.bid_sz_00))
-      elif curr_moving_average < row.fair_value-1:
+      elif curr_moving_average < row.fair_value-self.band:
         sell_order = { "datetime": row.ts_recv, 
                      "option_symbol": row.symbol, 
                      "action": "S", 
@@ -110,7 +104,7 @@ class Strategy:
         # self.positions -= (int(row.ask_sz_00))
       
       print(order_count)
-      if order_count > 5000:
+      if order_count > self.max_orders:
         break
 
 
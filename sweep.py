@@ -0,0 +1,72 @@
+import os
+import sys
+import metrics
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from itertools import product
+from multiprocessing import Pool
+from typing import Dict, List
+from backtester import Backtester
+from market_data import HOURLY_CSV, OPTIONS_CSV, UNDERLYING_CSV, DailySnapshots, MarketData, QuoteTape, open_cache
+
+# one per worker process, mapped from the column cache by init_worker
+market_data : MarketData = None
+
+def parameter_grid(grid: Dict[str, List]) -> List[Dict]:
+  """
+  example: {"min_ask": [20, 25], "edge": [5, 10]} -> the 4 combinations as keyword dicts
+  """
+  names : List[str] = list(grid)
+  return [dict(zip(names, values)) for values in product(*(grid[name] for name in names))]
+
+def init_worker(csv_paths: tuple, quiet: bool) -> None:
+  global market_data
+  market_data = MarketData(*csv_paths)
+  if quiet:
+    sys.stdout = open(os.devnull, "w")
+
+def run_point(task: tuple) -> Dict:
+  strategy_class, strategy_args, params, start_date, end_date = task
+  strategy = strategy_class(*strategy_args, market_data=market_data, **params)
+  backtester : Backtester = Backtester(start_date, end_date, strategy, market_data=market_data)
+  backtester.calculate_pnl()
+  return {"pnl": backtester.pnl, "traded": backtester.traded, "trading_days": backtester.trading_days()}
+
+def sweep(strategy_class, grid, start_date: datetime, end_date: datetime, strategy_args: tuple = (),
+          processes: int = None, quiet: bool = True, options_csv: str = OPTIONS_CSV,
+          underlying_csv: str = UNDERLYING_CSV, hourly_csv: str = HOURLY_CSV) -> pd.DataFrame:
+  """
+  Backtests strategy_class(*strategy_args, market_data=..., **params) for every point of
+  grid (a dict of parameter -> values, or a list of keyword dicts) on a process pool,
+  one row of parameters and results per point.
+
+  Only the equity curves come back from the workers, the metrics are computed for all
+  points at once. Market data is never pickled: the column caches and daily snapshots
+  are built once up front and every worker memory-maps the same files, so the tape
+  sits in the page cache only once.
+  """
+  points : List[Dict] = parameter_grid(grid) if isinstance(grid, dict) else list(grid)
+  csv_paths : tuple = (options_csv, underlying_csv, hourly_csv)
+  for csv_path in csv_paths:
+    if os.path.exists(csv_path):
+      open_cache(csv_path)
+  DailySnapshots(QuoteTape(options_csv))
+
+  tasks : List[tuple] = [(strategy_class, tuple(strategy_args), params, start_date, end_date) for params in points]
+  with Pool(processes, initializer=init_worker, initargs=(csv_paths, quiet)) as pool:
+    runs : List[Dict] = pool.map(run_point, tasks, chunksize=1)
+  if not runs:
+    return pd.DataFrame(points)
+
+  equity : np.ndarray = np.array([run["pnl"] for run in runs])
+  traded : np.ndarray = np.array([run["traded"] for run in runs])
+  scores : Dict[str, np.ndarray] = metrics.summary(equity, runs[0]["trading_days"], traded=traded)
+  return pd.concat([pd.DataFrame(points), pd.DataFrame(scores)], axis=1)
+
+if __name__ == "__main__":
+  from Strategy import Strategy
+  results = sweep(Strategy, {"min_ask": [15, 20, 25, 30], "edge": [5, 10, 15], "max_quotes": [25, 100]},
+                  datetime(2024, 1, 1), datetime(2024, 3, 30),
+                  strategy_args=("2024-01-01", "2024-03-30", OPTIONS_CSV, HOURLY_CSV))
+  print(results.sort_values(by="overall_score", ascending=False).to_string(index=False))
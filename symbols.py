@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, NamedTuple
+
+class OptionSymbol(NamedTuple):
+  expiry : datetime
+  put_call : str
+  strike : float
+
+@lru_cache(maxsize=None)
+def parse_symbol(symbol: str) -> OptionSymbol:
+  """
+  example: SPX   240419C00800000 -> (2024-04-19, "C", 800.0)
+  the last 15 characters of an OCC symbol are yymmdd, C/P and the strike * 1000
+  """
+  code : str = symbol[-15:]
+  expiry : datetime = datetime(2000 + int(code[0:2]), int(code[2:4]), int(code[4:6]))
+  return OptionSymbol(expiry, code[6], int(code[7:]) / 1000)
+
+def parse_symbols(symbols) -> tuple:
+  """
+  vectorized parse_symbol over a whole symbol column, returns
+  (expiry datetime64[D], is_call bool, strike float64) arrays
+  """
+  raw : np.ndarray = np.asarray(symbols, dtype=str).astype(bytes)
+  if len(raw) == 0:
+    return np.array([], dtype="datetime64[D]"), np.array([], dtype=bool), np.array([], dtype=np.float64)
+  chars : np.ndarray = raw.view(np.uint8).reshape(len(raw), raw.dtype.itemsize)
+  lengths : np.ndarray = np.char.str_len(raw)
+  code : np.ndarray = chars[np.arange(len(raw))[:, None], lengths[:, None] - 15 + np.arange(15)]
+  digits : np.ndarray = code.astype(np.int64) - ord("0")
+
+  year : np.ndarray = 2000 + 10 * digits[:, 0] + digits[:, 1]
+  month : np.ndarray = 10 * digits[:, 2] + digits[:, 3]
+  day : np.ndarray = 10 * digits[:, 4] + digits[:, 5]
+  expiry : np.ndarray = ((year - 1970) * 12 + month - 1).astype("datetime64[M]").astype("datetime64[D]") + (day - 1)
+  is_call : np.ndarray = code[:, 6] == ord("C")
+  strike : np.ndarray = digits[:, 7:] @ (10 ** np.arange(7, -1, -1)) / 1000
+  return expiry, is_call, strike
+
+class SymbolTable:
+  """
+  Interned option symbols: every symbol gets a dense int id on first sight, and its
+  parsed expiry / put-call / strike are kept in columns indexed by that id. One
+  table is shared by the backtester and strategies so ids mean the same thing
+  everywhere.
+  """
+
+  def __init__(self) -> None:
+    self.ids : Dict[str, int] = {}
+    self.symbols : List[str] = []
+    self.expiration_date : np.ndarray = np.array([], dtype="datetime64[D]")
+    self.is_call : np.ndarray = np.array([], dtype=bool)
+    self.strike : np.ndarray = np.array([], dtype=np.float64)
+
+  def __len__(self) -> int:
+    return len(self.symbols)
+
+  def __getitem__(self, symbol_id: int) -> str:
+    return self.symbols[symbol_id]
+
+  def id(self, symbol: str) -> int:
+    return self.ids.get(symbol, -1)
+
+  def intern(self, symbol: str) -> int:
+    return int(self.intern_many([symbol])[0])
+
+  def intern_many(self, symbols) -> np.ndarray:
+    """
+    ids for a whole symbol column; only symbols not seen before are parsed
+    """
+    if not isinstance(symbols, (pd.Series, pd.Categorical)):
+      symbols = np.asarray(symbols, dtype=object)
+    codes, uniques = pd.factorize(symbols)
+    uniques = np.asarray(uniques, dtype=object)
+    new : List[str] = [symbol for symbol in uniques if symbol not in self.ids]
+    if new:
+      for symbol in new:
+        self.ids[symbol] = len(self.symbols)
+        self.symbols.append(symbol)
+      expiry, is_call, strike = parse_symbols(new)
+      self.expiration_date = np.concatenate([self.expiration_date, expiry])
+      self.is_call = np.concatenate([self.is_call, is_call])
+      self.strike = np.concatenate([self.strike, strike])
+    unique_ids : np.ndarray = np.fromiter((self.ids[symbol] for symbol in uniques), dtype=np.int64, count=len(uniques))
+    return np.where(codes >= 0, unique_ids[np.maximum(codes, 0)] if len(unique_ids) else -1, -1)
+
+# the table the backtester, the quote tape and strategies share by default
+SYMBOLS : SymbolTable = SymbolTable()
@@ -0,0 +1,22 @@
+import os
+import sys
+import contextlib
+import pytest
+
+# the modules are top-level scripts next to this directory, not an installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark
+from market_data import MarketData
+
+@pytest.fixture(scope="session")
+def tape(tmp_path_factory):
+  """
+  a small synthetic tape from benchmark.generate_tape: its paths and a MarketData over them,
+  with the column cache under the tape's own directory
+  """
+  directory = tmp_path_factory.mktemp("tape")
+  paths = benchmark.generate_tape(3000, 300, str(directory), seed=0)
+  with contextlib.chdir(directory):
+    market_data = MarketData(paths["options"], paths["minute"], paths["hourly"])
+  return paths, market_data
@@ -0,0 +1,61 @@
+import io
+import contextlib
+import pandas as pd
+import pytest
+from datetime import datetime
+from backtester import Backtester
+from benchmark import OrderFile
+from market_data import MarketData, to_epoch_day
+
+def run(start_date, end_date, strategy, market_data: MarketData, **kwargs) -> Backtester:
+  with contextlib.redirect_stdout(io.StringIO()):
+    backtester = Backtester(start_date, end_date, strategy, market_data=market_data, progress_interval=None, **kwargs)
+    backtester.calculate_pnl()
+    backtester.compute_overall_score()
+  return backtester
+
+def test_regression(tape):
+  """
+  pins the result of the synthetic tape's order file: a change here is a change in
+  how orders fill, settle or are scored
+  """
+  paths, market_data = tape
+  backtester = run(datetime(2024, 1, 1), datetime(2024, 3, 30), OrderFile(paths["orders"]), market_data)
+  # 63 sessions from 2024-01-02 to 2024-03-28, then the final liquidation
+  assert len(backtester.pnl) == 64
+  assert len(backtester.rejected_orders) == 0
+  assert backtester.pnl[-1] == pytest.approx(99_206_034.5, rel=1e-9)
+  assert backtester.overall_score == pytest.approx(-191.808099749, rel=1e-6)
+
+class Orders:
+
+  def __init__(self, orders: pd.DataFrame) -> None:
+    self.orders = orders
+
+  def generate_orders(self) -> pd.DataFrame:
+    return self.orders
+
+def test_expiry_on_a_holiday_settles_at_the_next_session(tape, tmp_path):
+  paths, _ = tape
+  # no SPX data on 2024-01-15 makes it a holiday
+  minute = pd.read_csv(paths["minute"])
+  minute_path = str(tmp_path / "spx_minute_holiday.csv")
+  minute[minute["date"] != 20240115].to_csv(minute_path, index=False)
+  with contextlib.chdir(tmp_path):
+    market_data = MarketData(paths["options"], minute_path, paths["hourly"])
+
+  # a contract expiring on the holiday, bought the session before
+  options = pd.read_csv(paths["options"])
+  friday = options[options["ts_recv"].str.startswith("2024-01-12") & options["symbol"].str.contains("240115")].iloc[0]
+  orders = pd.DataFrame({"datetime": [friday["ts_recv"]], "option_symbol": [friday["symbol"]], "action": ["B"], "order_size": [1]})
+
+  through_friday = run(datetime(2024, 1, 12), datetime(2024, 1, 12), Orders(orders), market_data, instrument=True)
+  assert through_friday.instruments.counters.get("filled") == 1
+  assert through_friday.instruments.counters.get("settled", 0) == 0
+
+  through_tuesday = run(datetime(2024, 1, 12), datetime(2024, 1, 16), Orders(orders), market_data, instrument=True)
+  assert to_epoch_day("2024-01-15") not in through_tuesday.days.tolist()
+  assert len(through_tuesday.days) == 2
+  assert through_tuesday.instruments.counters.get("settled") == 1
+  assert len(through_tuesday.open_orders) == 0
+  assert len(through_tuesday.pnl) == len(through_tuesday.days) + 1
@@ -0,0 +1,90 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from market_data import NS_PER_DAY, LatestQuotes, MinuteBars, QuoteTape, build_cache, to_epoch_day
+from symbols import SymbolTable
+
+def ms(hour: int, minute: int) -> int:
+  # ms_of_day is EST, the tape clock is UTC
+  return ((hour - 5) * 60 + minute) * 60_000
+
+@pytest.fixture
+def bars() -> MinuteBars:
+  return MinuteBars(pd.DataFrame({
+    "date": [20240102, 20240102, 20240102, 20240103, 20240103],
+    # 2024-01-02 misses 14:32 and the close, 2024-01-03 opens late
+    "ms_of_day": [ms(14, 31), ms(14, 33), ms(20, 59), ms(14, 35), ms(21, 0)],
+    "price": [100.0, 101.0, 102.0, 200.0, 201.0],
+  }))
+
+def test_minute_bars_clamp_to_session(bars):
+  assert bars.price("2024-01-02", 14, 31) == 100.0
+  assert bars.price("2024-01-02", 9, 0) == 100.0
+  assert bars.price("2024-01-03", 23, 59) == 201.0
+
+def test_minute_bars_fill_gaps(bars):
+  # missing bars take the nearest earlier one, a leading gap the first bar of the day
+  assert bars.price("2024-01-02", 14, 32) == 100.0
+  assert bars.price("2024-01-02", 21, 0) == 102.0
+  assert bars.price("2024-01-03", 14, 31) == 200.0
+  with pytest.raises(KeyError):
+    bars.price("2024-01-04", 15, 0)
+
+def test_minute_bars_vectorized_lookup_matches_scalar(bars):
+  days = np.array([to_epoch_day("2024-01-02"), to_epoch_day("2024-01-03"), to_epoch_day("2024-01-02"), to_epoch_day("2024-01-04")])
+  minutes = np.array([14 * 60 + 32, 13 * 60, 22 * 60, 15 * 60])
+  ts = days * NS_PER_DAY + minutes * 60_000_000_000
+  prices = bars.prices_at(ts)
+  assert prices[:3].tolist() == [bars.price(int(day), 0, int(minute)) for day, minute in zip(days[:3], minutes[:3])]
+  assert np.isnan(prices[3])
+
+def write_tape(path: str, n: int = 50, seed: int = 0) -> pd.DataFrame:
+  rng = np.random.default_rng(seed)
+  ts = np.datetime64("2024-01-02T14:30:00", "ns") + rng.integers(0, 2 * NS_PER_DAY, n).astype("timedelta64[ns]")
+  symbols = np.array(["SPX   240119C04800000", "SPX   240119P04700000", "SPX   240216C05000000"], dtype=object)[rng.integers(0, 3, n)]
+  symbols[::9] = None
+  tape = pd.DataFrame({
+    "ts_recv": np.datetime_as_string(ts, unit="ns").astype(object) + "Z",
+    "symbol": symbols,
+    "bid_px_00": np.round(rng.uniform(1, 50, n), 2),
+    "ask_px_00": np.round(rng.uniform(51, 100, n), 2),
+    "bid_sz_00": rng.integers(1, 100, n),
+    "ask_sz_00": rng.integers(1, 100, n),
+  })
+  tape.to_csv(path, index=False)
+  return tape
+
+def test_build_cache_chunked_matches_single_chunk(tmp_path):
+  csv_path = str(tmp_path / "options.csv")
+  write_tape(csv_path)
+  chunked = build_cache(csv_path, str(tmp_path / "chunked"), chunk_rows=7)
+  single = build_cache(csv_path, str(tmp_path / "single"), chunk_rows=1 << 20)
+
+  names = sorted(name for name in os.listdir(single) if name.endswith(".npy"))
+  assert names == sorted(name for name in os.listdir(chunked) if name.endswith(".npy"))
+  assert "symbol.codes.npy" in names
+  for name in names:
+    np.testing.assert_array_equal(np.load(os.path.join(chunked, name)), np.load(os.path.join(single, name)), err_msg=name)
+  ts = np.load(os.path.join(single, "ts_recv.npy"))
+  assert (np.diff(ts) >= 0).all()
+
+def test_quotes_without_a_symbol_stay_off_the_tape(tmp_path):
+  csv_path = str(tmp_path / "options.csv")
+  written = write_tape(csv_path)
+  symbols = SymbolTable()
+  tape = QuoteTape(csv_path, symbols, cache_dir=str(tmp_path / "cache"))
+  assert (tape.symbol_codes < 0).sum() == written["symbol"].isna().sum()
+
+  quotes = LatestQuotes(len(symbols))
+  rows = 0
+  for batch in tape.batches(batch_size=8):
+    assert (batch["symbol_id"] >= 0).all()
+    rows += len(batch["ts_recv"])
+    quotes.update(batch)
+  assert rows == written["symbol"].notna().sum()
+
+  latest = written.dropna(subset=["symbol"]).assign(ts=lambda frame: pd.to_datetime(frame["ts_recv"]))
+  latest = latest.sort_values("ts", kind="stable").groupby("symbol").tail(1)
+  ids = symbols.intern_many(latest["symbol"].to_numpy())
+  assert quotes.bid_px_00[ids].tolist() == latest["bid_px_00"].tolist()
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from positions import BUY, SELL, PositionBook
+
+SYMBOL = "SPX   240119C04800000"
+EXPIRY = int(np.datetime64("2024-01-19", "D").astype(np.int64))
+
+def open_position(book: PositionBook, side: int = BUY, size: float = 5, symbol: str = SYMBOL, symbol_id: int = 0,
+                  expiry: int = EXPIRY) -> int:
+  return book.open(symbol, symbol_id, side, size, True, 4800.0, expiry, 15, 0, 9.5, 10.0)
+
+def test_net_increases_reduces_and_closes():
+  book = PositionBook()
+  slot = open_position(book)
+  assert book.net(SYMBOL, BUY, 3)
+  assert book.order_size[slot] == 8
+  assert book.net(SYMBOL, SELL, 2)
+  assert (book.side[slot], book.order_size[slot]) == (BUY, 6)
+  assert book.net(SYMBOL, SELL, 6)
+  assert SYMBOL not in book
+  assert book.slots_of([0]).tolist() == [-1]
+  assert not book.net(SYMBOL, BUY, 1)
+
+def test_net_flips_through_zero():
+  book = PositionBook()
+  slot = open_position(book, BUY, 5)
+  assert book.net(SYMBOL, SELL, 8)
+  assert (book.side[slot], book.order_size[slot]) == (SELL, 3)
+  assert book.slots_of([0]).tolist() == [slot]
+
+def test_mark_rolls_running_prices():
+  book = PositionBook()
+  long_slot = open_position(book, BUY, 2)
+  short_slot = open_position(book, SELL, 1, "SPX   240119P04800000", 1)
+  slots = np.array([long_slot, short_slot])
+
+  # longs are marked to the bid against the running ask, shorts to the ask against the running bid
+  capital, portfolio = book.mark(slots, np.array([12.0, 9.0]), np.array([12.5, 11.0]))
+  assert portfolio == pytest.approx((12.0 - 10.0) * 100 * 2)
+  assert capital == pytest.approx((9.5 - 11.0) * 100 * 1)
+  assert (book.running_ask_px_00[long_slot], book.running_bid_px_00[short_slot]) == (12.0, 11.0)
+  # entry prices stay put
+  assert (book.ask_px_00[long_slot], book.bid_px_00[short_slot]) == (10.0, 9.5)
+
+  capital, portfolio = book.mark(slots, np.array([11.0, 9.0]), np.array([11.5, 11.0]))
+  assert portfolio == pytest.approx((11.0 - 12.0) * 100 * 2)
+  assert capital == 0
+
+def test_expiry_between_sessions_settles_at_the_next_one():
+  book = PositionBook()
+  holiday = int(np.datetime64("2024-01-15", "D").astype(np.int64))
+  friday, tuesday = holiday - 3, holiday + 1
+  slot = open_position(book, expiry=holiday)
+
+  assert len(book.expiring(friday, friday - 1)) == 0
+  assert book.expiring(tuesday, friday).tolist() == [slot]
+  book.remove_expiring(tuesday, friday)
+  assert len(book) == 0
+  assert holiday not in book.by_expiry
+
+def test_grows_past_capacity():
+  book = PositionBook(capacity=2)
+  for i in range(5):
+    open_position(book, symbol=f"SPX   240119C0{4800 + i}000", symbol_id=i)
+  assert len(book) == 5
+  assert book.capacity >= 5
+  assert sorted(book.slots_of(np.arange(5)).tolist()) == sorted(book.slots.values())
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from pricing import IV_AT_BOUND, IV_CONVERGED, IV_OUT_OF_BOUNDS, black_scholes, implied_volatilities
+
+S = 4800.0
+K = np.array([4400.0, 4600.0, 4800.0, 5000.0, 5200.0])
+T = np.array([0.05, 0.1, 0.25, 0.5, 1.0])
+
+@pytest.mark.parametrize("is_call", [True, False])
+@pytest.mark.parametrize("sigma", [0.08, 0.15, 0.4, 1.5])
+def test_round_trip(sigma, is_call):
+  price = black_scholes(S, K, T, 0.01, sigma, is_call).price
+  result = implied_volatilities(price, S, K, T, 0.01, is_call)
+  assert (result.status == IV_CONVERGED).all()
+  np.testing.assert_allclose(result.sigma, sigma, atol=1e-6)
+
+def test_pinned_at_bound():
+  price = black_scholes(S, K, T, 0.01, 6.0, True).price
+  result = implied_volatilities(price, S, K, T, 0.01, True, sigma_bounds=(1e-4, 5.0))
+  assert (result.status == IV_AT_BOUND).all()
+  assert (result.sigma == 5.0).all()
+
+def test_outside_no_arbitrage_bounds():
+  # above the underlying, below intrinsic, and a zero time to expiry
+  result = implied_volatilities([S + 1, 1.0, 50.0], S, [4800.0, 4000.0, 4800.0], [0.5, 0.5, 0.0])
+  assert (result.status == IV_OUT_OF_BOUNDS).all()
+  assert np.isnan(result.sigma).all()
+
+def test_low_vega_is_not_converged():
+  # far out of the money a day from expiry the price barely depends on sigma
+  price = black_scholes(S, 7000.0, 1 / 365, 0.01, 0.15, True).price
+  result = implied_volatilities(price, S, 7000.0, 1 / 365)
+  assert result.status != IV_CONVERGED